@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.8 on 2026-10-18 12:19
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def render_posts(apps, schema_editor):
+    from commons.templatetags.markup_markdown import render_markdown
+
+    BlogPost = apps.get_model('blog', 'BlogPost')
+    for post in BlogPost.objects.all().iterator():
+        BlogPost.objects.filter(pk=post.pk).update(abstract_html=render_markdown(post.abstract),
+                                                   text_html=render_markdown(post.text))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='abstract_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='Chapeau (HTML)'),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='text_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='Contenu (HTML)'),
+        ),
+        migrations.RunPython(render_posts, migrations.RunPython.noop),
+    ]
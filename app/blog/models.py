@@ -7,6 +7,8 @@ from django.utils.timezone import now
 from django.core.urlresolvers import reverse
 from django.utils.text import slugify
 
+from commons.templatetags.markup_markdown import render_markdown
+
 
 POST_ICONS = {
     'achat': 'fa-shopping-cart',
@@ -146,6 +148,9 @@ class BlogPost(models.Model):
     tags = models.CharField(verbose_name='Étiquettes', max_length=100, blank=True, help_text='Étiquettes associées, séparées par un espace.')
     abstract = models.TextField(verbose_name='Chapeau', help_text='Mis en page avec Markdown.')
     text = models.TextField(verbose_name='Contenu', help_text='Mis en page avec Markdown.', blank=True)
+    # Rendered on save
+    abstract_html = models.TextField(verbose_name='Chapeau (HTML)', editable=False, blank=True)
+    text_html = models.TextField(verbose_name='Contenu (HTML)', editable=False, blank=True)
     author = models.ForeignKey(User, verbose_name='Auteur', )
     date_created = models.DateTimeField(verbose_name='Date de création', auto_now_add=True)
     approved_by = models.ForeignKey(User, verbose_name='Validateur', blank=True, null=True, related_name='+')
@@ -240,10 +245,13 @@ class BlogPost(models.Model):
 
     def save(self, *args, **kwargs):
         """
-        Override save behavior by computing the value of the slug field.
+        Override save behavior by computing the value of the slug field,
+        and by rendering the abstract and the text.
         """
 
         self.slug = slugify(self.title)
+        self.abstract_html = render_markdown(self.abstract)
+        self.text_html = render_markdown(self.text)
         return super(BlogPost, self).save(*args, **kwargs)
 
     def tags_list(self):
@@ -3,6 +3,7 @@ from django.core.urlresolvers import reverse
 from django.test import TestCase
 from blog.models import BlogPost
 from blog.forms import UserCreatePostForm
+from commons.templatetags.markup_markdown import render_markdown
 from notifications.models import Notification
 from profile.models import ActiveUser
 import datetime
@@ -28,6 +29,19 @@ class PostsTests(TestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
 
+    def test_rendered_html(self):
+        post = self.posts[0]
+        post.abstract = 'Hello **World**!'
+        post.text = 'Some <script>text</script>'
+        post.save()
+        self.assertEqual(post.abstract_html, render_markdown(post.abstract))
+        self.assertIn('<strong>World</strong>', post.abstract_html)
+        self.assertNotIn('<script>', post.text_html)
+
+        response = self.client.get(reverse('blog_post_show', kwargs={'pk': post.pk}))
+        self.assertContains(response, post.abstract_html)
+        self.assertContains(response, post.text_html)
+
 
 class LoginPostsTests(TestCase):
     fixtures = ['devel']
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from board.models import Message, AuthorStats
+
+
+class Command(BaseCommand):
+    help = "Recompute the number of messages of every author, see AuthorStats."
+
+    def handle(self, *args, **options):
+        numbers = dict(Message.objects.order_by().values_list('author').annotate(number=Count('pk')))
+        updated = 0
+
+        with transaction.atomic():
+            for stats in AuthorStats.objects.select_for_update():
+                number = numbers.pop(stats.author_id, 0)
+                if stats.number != number:
+                    AuthorStats.objects.filter(pk=stats.pk).update(number=number)
+                    updated += 1
+
+            # Authors that have no stats yet
+            AuthorStats.objects.bulk_create([AuthorStats(author_id=pk, number=number) for pk, number in numbers.items()])
+
+        self.stdout.write('%d counters updated, %d created.' % (updated, len(numbers)))
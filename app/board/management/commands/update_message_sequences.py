@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from board.models import Thread, Message
+
+
+class Command(BaseCommand):
+    help = "Compute the position (sequence) of every message in its thread."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Number of threads handled in each transaction.')
+
+    def update_thread(self, thread_id):
+        """
+        Renumber the messages of given thread and return the number of updated messages.
+        """
+        messages = list(Message.objects.filter(thread=thread_id).order_by('date', 'pk').values_list('pk', 'sequence'))
+        changes = [(pk, position) for position, (pk, sequence) in enumerate(messages) if position != sequence]
+        if changes:
+            # Sequences are unique: free the current values before renumbering
+            Message.objects.filter(pk__in=[pk for pk, position in changes]).update(sequence=F('sequence') * -1 - 1)
+            for pk, position in changes:
+                Message.objects.filter(pk=pk).update(sequence=position)
+        return len(changes)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_pk = 0
+        threads = 0
+        updated = 0
+
+        while True:
+            batch = list(Thread.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if len(batch) == 0:
+                break
+
+            with transaction.atomic():
+                for thread_id in batch:
+                    updated += self.update_thread(thread_id)
+
+            threads += len(batch)
+            last_pk = batch[-1]
+            self.stdout.write('%d threads handled, %d messages updated.' % (threads, updated))
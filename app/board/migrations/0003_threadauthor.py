@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.8 on 2026-10-18 12:01
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def compute_thread_authors(apps, schema_editor):
+    Message = apps.get_model('board', 'Message')
+    ThreadAuthor = apps.get_model('board', 'ThreadAuthor')
+
+    entries = {}
+    for thread_id, author_id, date in Message.objects.order_by('date').values_list('thread', 'author', 'date').iterator():
+        entry = entries.get((thread_id, author_id))
+        if entry is None:
+            entries[(thread_id, author_id)] = ThreadAuthor(thread_id=thread_id, author_id=author_id, date=date, number=1)
+        else:
+            entry.number += 1
+    ThreadAuthor.objects.bulk_create(entries.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('board', '0002_auto_20151222_1053'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThreadAuthor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField(verbose_name='Date du premier message')),
+                ('number', models.IntegerField(default=0, verbose_name='Nombre de messages')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Auteur')),
+            ],
+            options={
+                'verbose_name': 'Participant',
+                'ordering': ['date'],
+            },
+        ),
+        migrations.AddField(
+            model_name='threadauthor',
+            name='thread',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='thread_authors', to='board.Thread', verbose_name='Sujet'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='threadauthor',
+            unique_together=set([('thread', 'author')]),
+        ),
+        migrations.RunPython(compute_thread_authors, migrations.RunPython.noop),
+    ]
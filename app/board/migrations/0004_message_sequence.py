@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.8 on 2026-10-18 12:04
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def compute_message_sequences(apps, schema_editor):
+    Message = apps.get_model('board', 'Message')
+
+    # Messages are numbered by date in their thread
+    positions = []
+    thread_id, position = None, 0
+    messages = Message.objects.order_by('thread', 'date', 'pk').values_list('pk', 'thread', 'sequence')
+    for pk, thread, sequence in messages.iterator():
+        position = position + 1 if thread == thread_id else 0
+        thread_id = thread
+        if position != sequence:
+            positions.append((pk, position))
+
+    for start in range(0, len(positions), 500):
+        batch = positions[start:start + 500]
+        Message.objects.filter(pk__in=[pk for pk, position in batch]).update(
+            sequence=models.Case(*[models.When(pk=pk, then=models.Value(position)) for pk, position in batch],
+                                 output_field=models.IntegerField())
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0003_threadauthor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='sequence',
+            field=models.IntegerField(default=0, verbose_name='Position dans la discussion'),
+        ),
+        migrations.RunPython(compute_message_sequences, migrations.RunPython.noop),
+        migrations.AlterIndexTogether(
+            name='message',
+            index_together=set([('thread', 'sequence')]),
+        ),
+    ]
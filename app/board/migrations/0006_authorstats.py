@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.8 on 2026-10-18 12:43
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def compute_author_stats(apps, schema_editor):
+    Message = apps.get_model('board', 'Message')
+    AuthorStats = apps.get_model('board', 'AuthorStats')
+
+    numbers = Message.objects.order_by().values('author').annotate(number=models.Count('pk'))
+    AuthorStats.objects.bulk_create([AuthorStats(author_id=entry['author'], number=entry['number']) for entry in numbers],
+                                    batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('board', '0005_message_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.IntegerField(default=0, verbose_name='Nombre de messages')),
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='board_stats', to=settings.AUTH_USER_MODEL, verbose_name='Auteur')),
+            ],
+            options={
+                'verbose_name': "Statistiques d'un auteur",
+                'verbose_name_plural': 'Statistiques des auteurs',
+            },
+        ),
+        migrations.RunPython(compute_author_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.8 on 2026-10-18 12:49
+from __future__ import unicode_literals
+
+import datetime
+from django.db import migrations, models
+
+
+def compute_last_activity(apps, schema_editor):
+    Thread = apps.get_model('board', 'Thread')
+    Message = apps.get_model('board', 'Message')
+
+    dates = Message.objects.order_by().values('thread').annotate(date=models.Max('date'))
+    for entry in dates.iterator():
+        Thread.objects.filter(pk=entry['thread']).update(last_activity=entry['date'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0006_authorstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thread',
+            name='last_activity',
+            field=models.DateTimeField(db_index=True, default=datetime.datetime.now, verbose_name='Dernière activité'),
+        ),
+        migrations.RunPython(compute_last_activity, migrations.RunPython.noop),
+    ]
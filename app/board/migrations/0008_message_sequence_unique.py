@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.8 on 2026-10-18 12:59
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0007_thread_last_activity'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='message',
+            unique_together=set([('thread', 'sequence')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='message',
+            index_together=set([('date', 'id')]),
+        ),
+    ]
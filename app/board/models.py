@@ -1,18 +1,139 @@
 import datetime
 
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Prefetch, Case, When, Value, Count
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 
 from django.utils.text import slugify
 
 from blog.models import BlogPost
+from helpers.queryset import raw_delete
+from commons.templatetags.markup_bbcode import clear_cache as clear_bbcode_cache
 
 import difflib
 
 
 USE_DIFF_FOR_HISTORY = True
 
+# Cache key of the list of recent threads, cleared by board.signals
+RECENT_THREADS_KEY = 'board-recent-threads'
+RECENT_THREADS_DAYS = 7  # Number of days covered by this list
+
+# Cache key of the number of messages, cleared by board.signals
+MESSAGES_COUNT_KEY = 'board-messages-count'
+
+
+class ThreadQuerySet(models.QuerySet):
+    def with_authors(self):
+        """
+        Prefetch the authors summary of every thread in the queryset, so that
+        Thread.authors() does not hit the database anymore.
+        """
+        return self.prefetch_related('thread_authors')
+
+    def with_last_message(self):
+        """
+        Fetch the last message of every thread (and its author) in the same query.
+        """
+        return self.select_related('last_message__author')
+
+    def get_recent_ids(self, date_limit):
+        """
+        Return the ids of the threads that were active since date_limit, most recent first.
+        The threads that were active during the last RECENT_THREADS_DAYS days are kept
+        in the cache, so no query is needed for a date_limit in this range.
+        """
+        recent = cache.get(RECENT_THREADS_KEY)
+        if recent is None or date_limit < recent['since']:
+            since = datetime.datetime.combine(datetime.date.today() - datetime.timedelta(RECENT_THREADS_DAYS),
+                                              datetime.time())
+            since = min(since, date_limit)
+            threads = (Thread.objects.filter(last_activity__gte=since).order_by('-last_activity')
+                       .values_list('pk', 'last_activity'))
+            recent = {'since': since, 'threads': list(threads)}
+            cache.set(RECENT_THREADS_KEY, recent, 24 * 60 * 60)
+        return [pk for pk, last_activity in recent['threads'] if last_activity >= date_limit]
+
+    def active_since(self, date_limit):
+        """
+        Return the threads that were active since date_limit, most recent first.
+        """
+        return self.filter(pk__in=self.get_recent_ids(date_limit)).order_by('-last_activity')
+
+    def purge(self):
+        """
+        Delete the threads in the queryset, with their messages, flags, history and links,
+        using set-based statements in a single transaction. The per-message work done by
+        board.signals is skipped, but the counters of the authors, the cache of recent
+        threads and the search index are kept up-to-date.
+        :return: the number of deleted messages
+        """
+        # Imported here, as commons.search imports this module
+        from commons.search import SEARCH
+        from commons.search_backends import get_backend
+
+        thread_ids = list(self.values_list('pk', flat=True))
+        if len(thread_ids) == 0:
+            return 0
+        messages = Message.objects.filter(thread__in=thread_ids)
+
+        with transaction.atomic():
+            numbers = dict(messages.order_by().values_list('author').annotate(number=Count('pk')))
+            if numbers:
+                AuthorStats.objects.filter(author__in=numbers.keys()).update(
+                    number=F('number') - Case(*[When(author=pk, then=Value(number)) for pk, number in numbers.items()],
+                                              output_field=models.IntegerField())
+                )
+
+            for search_cfg in SEARCH:
+                model = search_cfg['manager'].model._meta.concrete_model
+                if model is Message:
+                    get_backend().remove_many(search_cfg, messages.values('pk'))
+                elif model is Thread:
+                    get_backend().remove_many(search_cfg, thread_ids)
+
+            Flag.objects.filter(thread__in=thread_ids).delete()
+            MessageHistory.objects.filter(message__thread__in=thread_ids).delete()
+            BlogBoardLink.objects.filter(thread__in=thread_ids).delete()
+            ThreadAuthor.objects.filter(thread__in=thread_ids).delete()
+
+            # Messages and threads have signal handlers, that would be run for every object:
+            # what they do was done above, and nothing references these objects anymore
+            deleted = raw_delete(messages)
+            raw_delete(Thread.objects.filter(pk__in=thread_ids))
+
+        cache.delete_many([RECENT_THREADS_KEY, MESSAGES_COUNT_KEY])
+        return deleted
+
+
+class MessageQuerySet(models.QuerySet):
+    def with_authors(self):
+        """
+        Fetch the author of every message, with its profile and its counter, in the same query.
+        """
+        return self.select_related('author__profile', 'author__board_stats')
+
+    def with_history(self):
+        """
+        Prefetch the modifications of every message in the queryset, so that
+        Message.last_modified() and Message.number_modified() do not hit the database anymore.
+        """
+        return self.prefetch_related(Prefetch('history', queryset=MessageHistory.objects.select_related('edited_by')))
+
+    def get_total_count(self):
+        """
+        Return the number of messages on the board. It is kept in the cache until a
+        message is created or deleted, so that the archives do not count the whole
+        table on each request.
+        """
+        count = cache.get(MESSAGES_COUNT_KEY)
+        if count is None:
+            count = Message.objects.count()
+            cache.set(MESSAGES_COUNT_KEY, count, 24 * 60 * 60)
+        return count
+
 
 class Thread(models.Model):
     title = models.CharField(verbose_name='Titre', max_length=80)
@@ -22,6 +143,10 @@ class Thread(models.Model):
     # models.DO_NOTHING is required as we update last_message using a *_delete signal.
     # if models.CASCADE or models.SET_DEFAULT, then its value is updated after signal handling.
     last_message = models.ForeignKey('Message', verbose_name='Dernier message', on_delete=models.DO_NOTHING, db_constraint=False, related_name='+', default=-1)
+    # Date of the last message, maintained by board.signals.
+    last_activity = models.DateTimeField(verbose_name='Dernière activité', default=datetime.datetime.now, db_index=True)
+
+    objects = ThreadQuerySet.as_manager()
 
     class Meta:
         get_latest_by = 'date_created'
@@ -35,13 +160,14 @@ class Thread(models.Model):
         """
         Annotate the current Thread by adding the related Flag object (if it
         exists for given user) as a `flag` attribute.
+        Use Flag.objects.annotate_threads to annotate a list of threads.
         :param user: Related user
         :return: None
         """
         if not user.is_authenticated():
             return
         try:
-            self.flag = Flag.objects.all().get(thread=self, user=user)
+            self.flag = Flag.objects.all().select_related('message').get(thread=self, user=user)
         except Flag.DoesNotExist:
             pass
 
@@ -55,13 +181,10 @@ class Thread(models.Model):
 
     def authors(self, N=None):
         """
-        Return an ordered list of N first authors.
+        Return an ordered list of N first authors. Use Thread.objects.with_authors()
+        to fetch the authors of a whole list of threads at once.
         """
-        authors = Message.objects.all().filter(thread=self).order_by('date').values_list('author')
-        tmp_set = set()
-        # http://stackoverflow.com/questions/6197409/ordered-sets-python-2-7
-        output = [User.objects.all().get(pk=x[0]) for x in authors
-                  if x[0] not in tmp_set and not tmp_set.add(x[0])]
+        output = [x.author for x in self.thread_authors.all()]
         if N is None:
             return output
         else:
@@ -75,6 +198,10 @@ class Message(models.Model):
     moderated = models.BooleanField(verbose_name='Message modéré ?', default=False,
                                     help_text='Si le message est modéré, son auteur ne pourra plus le modifier.')
     date = models.DateTimeField(verbose_name='Date', auto_now_add=True)
+    # Maintained by board.signals, see also the update_message_sequences command.
+    sequence = models.IntegerField(verbose_name='Position dans la discussion', default=0)
+
+    objects = MessageQuerySet.as_manager()
 
     class Meta:
         get_latest_by = 'date'
@@ -82,6 +209,13 @@ class Message(models.Model):
         verbose_name = 'Message'
         permissions = (('can_moderate', 'Peut modérer'),
                        ('can_destroy', 'Peut détruire'))
+        unique_together = (('thread', 'sequence'),)
+        index_together = (('date', 'id'),)
+
+    def save(self, *args, **kwargs):
+        # board.signals locks the thread to set the sequence of new messages
+        with transaction.atomic():
+            return super(Message, self).save(*args, **kwargs)
 
     def get_absolute_url(self):
         return reverse('board_message_show', kwargs={'message': self.pk})
@@ -93,7 +227,7 @@ class Message(models.Model):
         """
         Return the relative position in the thread, 0-indexed.
         """
-        return Message.objects.all().filter(thread=self.thread, date__lt=self.date).count()
+        return self.sequence
 
     def is_time_to_delete(self):
         """
@@ -107,19 +241,13 @@ class Message(models.Model):
         """
         Return the previous message, or None.
         """
-        try:
-            return Message.objects.all().filter(thread=self.thread, date__lt=self.date).latest()
-        except Message.DoesNotExist:
-            return None
+        return Message.objects.all().filter(thread=self.thread_id, sequence__lt=self.sequence).order_by('-sequence').first()
 
     def next_message(self):
         """
         Return the next message, or None.
         """
-        try:
-            return Message.objects.all().filter(thread=self.thread, date__gt=self.date)[0]
-        except IndexError:
-            return None
+        return Message.objects.all().filter(thread=self.thread_id, sequence__gt=self.sequence).order_by('sequence').first()
 
     def modify(self, author, text):
         """
@@ -138,20 +266,36 @@ class Message(models.Model):
 
         msg_hist = MessageHistory(message=self, edited_by=author, text=ntext)
         msg_hist.save()
+        clear_bbcode_cache(self.text)
         self.text = text
         self.save()
 
+    def _prefetched_history(self):
+        """
+        Return the list of modifications if they were prefetched (see Message.objects.with_history()),
+        or None.
+        """
+        if 'history' in getattr(self, '_prefetched_objects_cache', {}):
+            return list(self.history.all())
+        return None
+
     def last_modified(self):
         """
         Return the last modification.
         """
-        return MessageHistory.objects.filter(message=self).latest('date')
+        history = self._prefetched_history()
+        if history is None:
+            return MessageHistory.objects.filter(message=self).latest('date')
+        return max(history, key=lambda entry: entry.date) if history else None
 
     def number_modified(self):
         """
         Return the number of times this message was modified.
         """
-        return MessageHistory.objects.filter(message=self).count()
+        history = self._prefetched_history()
+        if history is None:
+            return MessageHistory.objects.filter(message=self).count()
+        return len(history)
 
 
 class MessageHistory(models.Model):
@@ -167,20 +311,179 @@ class MessageHistory(models.Model):
         verbose_name_plural = 'Éditions de message'
 
 
+class ThreadAuthorManager(models.Manager):
+    def get_queryset(self):
+        return super(ThreadAuthorManager, self).get_queryset().select_related('author__profile')
+
+    def add_message(self, message):
+        """
+        Take a newly created message into account.
+        """
+        updated = self.filter(thread=message.thread, author=message.author).update(number=F('number') + 1)
+        if updated == 0:
+            try:
+                with transaction.atomic():
+                    self.create(thread=message.thread, author=message.author, date=message.date, number=1)
+            except IntegrityError:
+                # Concurrently created by another message
+                self.filter(thread=message.thread, author=message.author).update(number=F('number') + 1)
+
+    def remove_message(self, message):
+        """
+        Take the deletion of given message into account. Must be called before
+        the message is actually deleted.
+        """
+        try:
+            entry = self.all().get(thread=message.thread, author=message.author)
+        except ThreadAuthor.DoesNotExist:
+            return
+
+        if entry.number <= 1:
+            entry.delete()
+            return
+
+        entry.number -= 1
+        if entry.date >= message.date:
+            # The first message of this author is removed
+            entry.date = (Message.objects.filter(thread=message.thread, author=message.author)
+                          .exclude(pk=message.pk).values_list('date', flat=True).first())
+        entry.save()
+
+
+class ThreadAuthor(models.Model):
+    """
+    Denormalized list of the distinct authors of a thread, ordered by their
+    first message. It is kept up-to-date by board.signals.
+    """
+    thread = models.ForeignKey(Thread, verbose_name='Sujet', related_name='thread_authors')
+    author = models.ForeignKey(User, verbose_name='Auteur', related_name='+')
+    date = models.DateTimeField(verbose_name='Date du premier message')
+    number = models.IntegerField(verbose_name='Nombre de messages', default=0)
+
+    objects = ThreadAuthorManager()
+
+    class Meta:
+        ordering = ['date']
+        verbose_name = 'Participant'
+        unique_together = (('thread', 'author'),)
+
+
+class AuthorStatsManager(models.Manager):
+    def add_message(self, message):
+        """
+        Take a newly created message into account.
+        """
+        updated = self.filter(author=message.author_id).update(number=F('number') + 1)
+        if updated == 0:
+            try:
+                with transaction.atomic():
+                    self.create(author_id=message.author_id, number=1)
+            except IntegrityError:
+                # Concurrently created by another message
+                self.filter(author=message.author_id).update(number=F('number') + 1)
+
+    def remove_message(self, message):
+        """
+        Take the deletion of given message into account.
+        """
+        self.filter(author=message.author_id, number__gt=0).update(number=F('number') - 1)
+
+
+class AuthorStats(models.Model):
+    """
+    Denormalized number of messages posted by each user, displayed with every
+    message. It is kept up-to-date by board.signals, and can be recomputed with
+    the update_author_stats command.
+    """
+    author = models.OneToOneField(User, verbose_name='Auteur', related_name='board_stats')
+    number = models.IntegerField(verbose_name='Nombre de messages', default=0)
+
+    objects = AuthorStatsManager()
+
+    class Meta:
+        verbose_name = 'Statistiques d\'un auteur'
+        verbose_name_plural = 'Statistiques des auteurs'
+
+
 class FlagManager(models.Manager):
+    def annotate_threads(self, threads, user):
+        """
+        Annotate every given thread by adding the related Flag object (if it
+        exists for given user) as a `flag` attribute, using a single query.
+        :param threads: An iterable of Thread instances
+        :param user: Related user
+        :return: The list of threads
+        """
+        threads = list(threads)
+        if not user.is_authenticated() or len(threads) == 0:
+            return threads
+
+        flags = self.filter(user=user, thread__in=[thread.pk for thread in threads]).select_related('message')
+        flags = {flag.thread_id: flag for flag in flags}
+        for thread in threads:
+            if thread.pk in flags:
+                thread.flag = flags[thread.pk]
+                thread.flag.thread = thread
+        return threads
+
     def read(self, user, message, force=False):
         """
-        Look for a Flag and create if needed. Update the message if newer, or
-        if force is True. Return the flag.
+        Mark given message as read. The flag is created if needed, and is only moved
+        if given message is newer than the flagged one (or if force is True), using
+        a single conditional statement.
+        :return: True if the flag was created or moved
+        """
+        if not user.is_authenticated():
+            return False
+        flags = self.filter(user=user, thread=message.thread_id)
+        if not force:
+            # A condition on the column of the flag, not on a join with its message
+            flags = flags.filter(message__in=Message.objects.filter(thread=message.thread_id,
+                                                                    sequence__lt=message.sequence))
+        if flags.update(message=message) > 0:
+            return True
+
+        # No flag, or the flag is already up-to-date
+        if self.filter(user=user, thread=message.thread_id).exists():
+            return False
+        try:
+            with transaction.atomic():
+                self.create(user=user, thread_id=message.thread_id, message=message)
+            return True
+        except IntegrityError:
+            return False
+
+    def read_threads(self, user, threads):
+        """
+        Mark the last message of every given thread as read, using one query to find
+        the existing flags, one to move them, and one to create the others.
+        :param threads: An iterable of Thread instances
+        :param user: Related user
+        :return: None
         """
         if not user.is_authenticated():
             return
-        flag, created = self.get_or_create(user=user, thread=message.thread, defaults={'message': message})
-        # Only update if needed or wanted
-        if force or (flag.message.date < message.date):
-            flag.message = message
-            flag.save()
-        return flag
+        last_messages = {thread.pk: thread.last_message_id for thread in threads}
+        if len(last_messages) == 0:
+            return
+
+        with transaction.atomic():
+            existing = set(self.filter(user=user, thread__in=last_messages.keys()).values_list('thread', flat=True))
+            if existing:
+                # The last message of a thread is never older than the flagged one
+                self.filter(user=user, thread__in=existing).update(
+                    message=Case(*[When(thread=pk, then=Value(last_messages[pk])) for pk in existing],
+                                 output_field=models.IntegerField())
+                )
+            try:
+                with transaction.atomic():
+                    self.bulk_create([Flag(user=user, thread_id=pk, message_id=message_id)
+                                      for pk, message_id in last_messages.items() if pk not in existing])
+            except IntegrityError:
+                # Some flags were concurrently created, handle them one by one
+                for pk, message_id in last_messages.items():
+                    if pk not in existing:
+                        self.update_or_create(user=user, thread_id=pk, defaults={'message_id': message_id})
 
     def unread(self, user, message):
         """
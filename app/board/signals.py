@@ -1,9 +1,22 @@
+from django.core.cache import cache
+from django.db.models import F, Max
 from django.db.models.signals import post_save, post_delete, pre_save, pre_delete
 from django.dispatch import receiver
 
 from helpers.decorators import signal_ignore_fixture
 
-from .models import Message, Flag
+from .models import Thread, Message, Flag, ThreadAuthor, AuthorStats, RECENT_THREADS_KEY, MESSAGES_COUNT_KEY
+
+
+@receiver(pre_save, sender=Message)
+@signal_ignore_fixture
+def set_sequence_on_message_creation(sender, **kwargs):
+    message = kwargs['instance']
+    if message.pk is None:
+        # Concurrent messages wait for the lock, held until Message.save() commits
+        Thread.objects.select_for_update().filter(pk=message.thread_id).exists()
+        last = Message.objects.filter(thread=message.thread_id).aggregate(sequence=Max('sequence'))['sequence']
+        message.sequence = 0 if last is None else last + 1
 
 
 @receiver(post_save, sender=Message)
@@ -12,8 +25,12 @@ def update_thread_on_message_creation(sender, created, **kwargs):
     if created:
         message = kwargs['instance']
         message.thread.last_message = message
+        message.thread.last_activity = message.date
         message.thread.number += 1
         message.thread.save()
+        cache.delete_many([RECENT_THREADS_KEY, MESSAGES_COUNT_KEY])
+        ThreadAuthor.objects.add_message(message)
+        AuthorStats.objects.add_message(message)
 
 
 @receiver(pre_delete, sender=Message)
@@ -26,14 +43,29 @@ def update_thread_on_message_deletion(sender, **kwargs):
     else:
         Flag.objects.filter(thread=message.thread, message=message).update(message=previous)
 
+    ThreadAuthor.objects.remove_message(message)
+    AuthorStats.objects.remove_message(message)
+
     thread = message.thread
 
     if thread.last_message == message:
         if previous is not None:
             thread.last_message = previous
+            thread.last_activity = previous.date
 
     thread.number -= 1
     thread.save()
+    cache.delete_many([RECENT_THREADS_KEY, MESSAGES_COUNT_KEY])
+
+
+@receiver(post_delete, sender=Message)
+def update_sequences_on_message_deletion(sender, **kwargs):
+    message = kwargs['instance']
+    # Sequences are unique: move the next messages to negative values first, so that
+    # the order in which rows are updated does not matter
+    following = Message.objects.filter(thread=message.thread_id)
+    following.filter(sequence__gt=message.sequence).update(sequence=F('sequence') * -1)
+    following.filter(sequence__lt=0).update(sequence=F('sequence') * -1 - 1)
 
 
 @receiver(post_delete, sender=Message)
@@ -42,3 +74,8 @@ def remove_empty_thread_on_message_deletion(sender, **kwargs):
 
     if message.thread.number == 0:
         message.thread.delete()
+
+
+@receiver(post_delete, sender=Thread)
+def clear_recent_threads_on_thread_deletion(sender, **kwargs):
+    cache.delete(RECENT_THREADS_KEY)
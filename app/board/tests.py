@@ -1,7 +1,24 @@
+import datetime
+import importlib
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.paginator import Paginator, EmptyPage
 from django.core.urlresolvers import reverse
+from django.apps import apps
+from django.db import connection, transaction, IntegrityError
+from django.db.models import F
 from django.test import TestCase
-from board.models import Thread, Message, Flag
+from django.test.utils import CaptureQueriesContext
+from board.models import Thread, Message, Flag, ThreadAuthor, AuthorStats, MessageHistory, BlogBoardLink, RECENT_THREADS_KEY
+from board.views import MESSAGES_PER_THREADPAGE
 from blog.models import BlogPost
+from commons.models import SearchDocument, SearchTerm
+from commons.search import SEARCH
+from commons.search_backends import get_backend
+from commons.templatetags import markup_bbcode
+from helpers.paginator import KeysetPaginator, SequencePaginator
 from profile.models import ActiveUser
 
 
@@ -171,6 +188,565 @@ class MessageViewsTests(TestCase):
         response = self.client.get(url, follow=True)
         self.assertEqual(response.status_code, 200)
 
+    def test_modify_clears_bbcode_cache(self):
+        message = self.messages[0]
+        message.text = '[b]Hello World![/b] ' * 20
+        message.save()
+        key = markup_bbcode._cache_key(message.text, True)
+        markup_bbcode.bbcode(message.text)
+        self.assertIsNotNone(cache.get(key))
+
+        message.modify(message.author, 'Hello World!')
+        self.assertIsNone(cache.get(key))
+
+
+class ThreadAuthorsTests(TestCase):
+    fixtures = ['devel']
+
+    def setUp(self):
+        self.admin = ActiveUser.objects.get(username='admin')
+        self.user1 = ActiveUser.objects.get(username='user1')
+
+        self.thread = Thread(title='Hello World!')
+        self.thread.save()
+
+    def post(self, author, text='Hello World!'):
+        message = Message(author=author, thread=self.thread, text=text)
+        message.save()
+        return message
+
+    def test_authors_order(self):
+        self.post(self.user1)
+        self.post(self.admin)
+        self.post(self.user1)
+
+        self.assertListEqual(self.thread.authors(), [self.user1, self.admin])
+        self.assertListEqual(self.thread.authors(1), [self.user1])
+        self.assertEqual(ThreadAuthor.objects.get(thread=self.thread, author=self.user1).number, 2)
+
+    def test_authors_on_deletion(self):
+        first = self.post(self.user1)
+        self.post(self.admin)
+        last = self.post(self.user1)
+
+        # Remove the first message of user1, who is now the second author
+        first.delete()
+        self.assertListEqual(self.thread.authors(), [self.admin, self.user1])
+        self.assertEqual(ThreadAuthor.objects.get(thread=self.thread, author=self.user1).date, last.date)
+
+        # Remove the last message of user1
+        last.delete()
+        self.assertListEqual(self.thread.authors(), [self.admin])
+
+    def test_authors_prefetch(self):
+        for thread in Thread.objects.all():
+            Message(author=self.user1, thread=thread, text='Hello World!').save()
+
+        threads = Thread.objects.with_authors()
+        with self.assertNumQueries(2):
+            authors = [[user.profile.avatar for user in thread.authors()] for thread in threads]
+        self.assertEqual(len(authors), Thread.objects.count())
+
+        # Compare with the full list of messages
+        for thread in threads:
+            expected = []
+            for message in Message.objects.filter(thread=thread).order_by('date'):
+                if message.author not in expected:
+                    expected.append(message.author)
+            self.assertListEqual(thread.authors(), expected)
+
+
+class MessageSequenceTests(TestCase):
+    fixtures = ['devel']
+
+    def setUp(self):
+        self.user = ActiveUser.objects.get(username='user1')
+        self.thread = Thread(title='Hello World!')
+        self.thread.save()
+        self.messages = []
+        for i in range(MESSAGES_PER_THREADPAGE * 2 + 5):
+            message = Message(author=self.user, thread=self.thread, text='Hello %d' % i)
+            message.save()
+            self.messages.append(message)
+
+    def sequences(self):
+        return list(Message.objects.filter(thread=self.thread).order_by('date', 'pk').values_list('sequence', flat=True))
+
+    def test_sequence_on_creation(self):
+        self.assertListEqual(self.sequences(), list(range(len(self.messages))))
+        self.assertEqual(self.messages[3].position(), 3)
+
+    def test_sequence_on_deletion(self):
+        self.messages[3].delete()
+        self.assertListEqual(self.sequences(), list(range(len(self.messages) - 1)))
+
+        message = Message.objects.get(pk=self.messages[4].pk)
+        self.assertEqual(message.position(), 3)
+        self.assertEqual(message.previous_message(), self.messages[2])
+        self.assertEqual(message.next_message(), self.messages[5])
+
+    def test_message_redirect(self):
+        message = self.messages[MESSAGES_PER_THREADPAGE + 2]
+        response = self.client.get(reverse('board_message_show', kwargs={'message': message.pk}))
+        expected = reverse('board_thread_show', kwargs={'thread': self.thread.pk, 'slug': self.thread.slug, 'page': 2})
+        self.assertRedirects(response, expected + '#msg%d' % message.pk, fetch_redirect_response=False)
+
+    def test_unread_redirect(self):
+        self.client.login(username='user1', password='user1')
+        Flag.objects.read(self.user, self.messages[MESSAGES_PER_THREADPAGE - 1])
+        response = self.client.get(reverse('board_thread_show_unread', kwargs={'thread': self.thread.pk}))
+        expected = reverse('board_thread_show', kwargs={'thread': self.thread.pk, 'slug': self.thread.slug, 'page': 2})
+        self.assertRedirects(response, expected + '#new', fetch_redirect_response=False)
+
+    def test_update_command(self):
+        Message.objects.filter(thread=self.thread).update(sequence=F('sequence') * 2 + 1000)
+        call_command('update_message_sequences', batch_size=1, stdout=StringIO())
+        self.assertListEqual(self.sequences(), list(range(len(self.messages))))
+
+    def test_migration(self):
+        migration = importlib.import_module('board.migrations.0004_message_sequence')
+        Message.objects.filter(thread=self.thread).update(sequence=F('sequence') * 2 + 1000)
+        migration.compute_message_sequences(apps, None)
+        self.assertListEqual(self.sequences(), list(range(len(self.messages))))
+
+    def test_unique_sequence(self):
+        message = Message(author=self.user, thread=self.thread, text='Hello', sequence=3)
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Message.objects.bulk_create([message])
+
+    def test_sequence_on_first_deletion(self):
+        self.messages[0].delete()
+        self.messages[-1].delete()
+        self.assertListEqual(self.sequences(), list(range(len(self.messages) - 2)))
+
+
+class AuthorStatsTests(TestCase):
+    fixtures = ['devel']
+
+    def setUp(self):
+        self.users = list(ActiveUser.objects.order_by('pk')[:2])
+        self.thread = Thread(title='Hello World!')
+        self.thread.save()
+
+    def numbers(self):
+        return [Message.objects.filter(author=user).count() for user in self.users]
+
+    def stats(self):
+        stats = dict(AuthorStats.objects.values_list('author', 'number'))
+        return [stats.get(user.pk, 0) for user in self.users]
+
+    def test_fixture(self):
+        self.assertListEqual(self.stats(), self.numbers())
+
+    def test_creation_and_deletion(self):
+        messages = [Message.objects.create(author=user, thread=self.thread, text='Hello') for user in self.users * 2]
+        self.assertListEqual(self.stats(), self.numbers())
+
+        messages[0].delete()
+        self.assertListEqual(self.stats(), self.numbers())
+
+        self.thread.delete()
+        self.assertListEqual(self.stats(), self.numbers())
+
+    def test_new_author(self):
+        user = ActiveUser.objects.create_user(username='fake', password='fake')
+        Message.objects.create(author=user, thread=self.thread, text='Hello')
+        self.assertEqual(AuthorStats.objects.get(author=user).number, 1)
+
+    def test_update_command(self):
+        AuthorStats.objects.filter(author=self.users[0]).update(number=42)
+        AuthorStats.objects.filter(author=self.users[1]).delete()
+        call_command('update_author_stats', stdout=StringIO())
+        self.assertListEqual(self.stats(), self.numbers())
+
+    def test_thread_page(self):
+        for user in self.users * 3:
+            Message.objects.create(author=user, thread=self.thread, text='Hello')
+        url = reverse('board_thread_show', kwargs={'thread': self.thread.pk, 'slug': self.thread.slug})
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        # Counters come with the authors, messages are not counted anymore
+        self.assertEqual([query['sql'] for query in context.captured_queries if 'COUNT(' in query['sql']], [])
+        self.assertContains(response, '<span class="badge">{}</span>'.format(self.numbers()[0]))
+
+
+class ThreadPageQueriesTests(TestCase):
+    """
+    The number of queries needed to display a page of a thread should not depend
+    on the number of messages, nor on their authors.
+    """
+    fixtures = ['devel']
+
+    def setUp(self):
+        self.user = ActiveUser.objects.get(username='user1')
+        self.client.login(username='user1', password='user1')
+
+        # Two full pages and a page of 3 messages
+        self.thread = Thread(title='Hello World!')
+        self.thread.save()
+        authors = list(ActiveUser.objects.all())
+        for i in range(MESSAGES_PER_THREADPAGE * 2 + 3):
+            message = Message(author=authors[i % len(authors)], thread=self.thread, text='Hello %d' % i)
+            message.save()
+            if i % 4 == 0:
+                message.modify(self.user, 'Hello again %d' % i)
+
+    def count_queries(self, page):
+        url = reverse('board_thread_show', kwargs={'thread': self.thread.pk, 'slug': self.thread.slug, 'page': page})
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def test_page_size(self):
+        # Flag is up-to-date on the second visit
+        for page in [2, 3, 2, 3]:
+            self.count_queries(page)
+        self.assertEqual(self.count_queries(2), self.count_queries(3))
+
+    def test_unread(self):
+        Flag.objects.all().delete()
+        expected = self.count_queries(2)
+        Flag.objects.all().delete()
+        self.assertEqual(self.count_queries(3), expected)
+        self.assertEqual(Flag.objects.get(user=self.user, thread=self.thread).message, self.thread.last_message)
+
+    def test_history(self):
+        expected = MessageHistory.objects.get(message__thread=self.thread, message__sequence=0)
+        message = Message.objects.filter(thread=self.thread).with_history().get(sequence=0)
+        with self.assertNumQueries(0):
+            self.assertEqual(message.number_modified(), 1)
+            self.assertEqual(message.last_modified(), expected)
+
+
+class FlagReadTests(TestCase):
+    fixtures = ['devel']
+
+    def setUp(self):
+        self.user = ActiveUser.objects.get(username='user1')
+        self.threads = []
+        for i in range(3):
+            thread = Thread(title='Hello World %d!' % i)
+            thread.save()
+            for j in range(3):
+                Message(author=self.user, thread=thread, text='Hello %d' % j).save()
+            thread.refresh_from_db()
+            self.threads.append(thread)
+        self.messages = list(Message.objects.filter(thread=self.threads[0]).order_by('sequence'))
+
+    def flag(self, thread):
+        return Flag.objects.filter(user=self.user, thread=thread).values_list('message', flat=True).first()
+
+    def test_read(self):
+        self.assertTrue(Flag.objects.read(self.user, self.messages[1]))
+        self.assertEqual(self.flag(self.threads[0]), self.messages[1].pk)
+
+        # Flag only moves forward, in a single statement
+        with self.assertNumQueries(1):
+            self.assertTrue(Flag.objects.read(self.user, self.messages[2]))
+        self.assertEqual(self.flag(self.threads[0]), self.messages[2].pk)
+
+        # An up-to-date flag is not created again
+        with CaptureQueriesContext(connection) as context:
+            self.assertFalse(Flag.objects.read(self.user, self.messages[0]))
+        self.assertEqual(len(context), 2)
+        self.assertNotIn('JOIN', context.captured_queries[0]['sql'])
+        self.assertEqual(self.flag(self.threads[0]), self.messages[2].pk)
+
+        self.assertTrue(Flag.objects.read(self.user, self.messages[0], force=True))
+        self.assertEqual(self.flag(self.threads[0]), self.messages[0].pk)
+
+    def test_read_threads(self):
+        Flag.objects.read(self.user, self.messages[0])
+        with CaptureQueriesContext(connection) as context:
+            Flag.objects.read_threads(self.user, self.threads)
+        # One SELECT, one UPDATE and one INSERT, savepoints aside
+        self.assertEqual(len([query for query in context.captured_queries if 'SAVEPOINT' not in query['sql']]), 3)
+        for thread in self.threads:
+            self.assertEqual(self.flag(thread), thread.last_message_id)
+
+        # Nothing changes the second time
+        Flag.objects.read_threads(self.user, self.threads)
+        self.assertEqual(Flag.objects.filter(user=self.user, thread__in=self.threads).count(), len(self.threads))
+
+    def test_mark_read_view(self):
+        self.client.login(username='user1', password='user1')
+        response = self.client.get(reverse('board_mark_read'))
+        self.assertRedirects(response, reverse('board_latests'), fetch_redirect_response=False)
+        for thread in self.threads:
+            self.assertEqual(self.flag(thread), thread.last_message_id)
+
+
+class LastActivityTests(TestCase):
+    fixtures = ['devel']
+
+    def setUp(self):
+        cache.clear()
+        self.user = ActiveUser.objects.get(username='user1')
+        self.date_limit = datetime.datetime.now() - datetime.timedelta(days=1)
+        self.threads = []
+        for i in range(3):
+            thread = Thread(title='Hello World %d!' % i)
+            thread.save()
+            Message(author=self.user, thread=thread, text='Hello').save()
+            self.threads.append(thread)
+
+    def test_last_activity(self):
+        thread = self.threads[0]
+        first = Message.objects.get(thread=thread)
+        message = Message.objects.create(author=self.user, thread=thread, text='Hello again')
+        thread.refresh_from_db()
+        self.assertEqual(thread.last_activity, message.date)
+
+        message.delete()
+        thread.refresh_from_db()
+        self.assertEqual(thread.last_activity, first.date)
+
+    def test_recent_ids(self):
+        ids = [thread.pk for thread in reversed(self.threads)]
+        self.assertListEqual(Thread.objects.get_recent_ids(self.date_limit), ids)
+        with self.assertNumQueries(0):
+            self.assertListEqual(Thread.objects.get_recent_ids(self.date_limit), ids)
+
+        # A new message moves its thread first
+        Message.objects.create(author=self.user, thread=self.threads[1], text='Hello again')
+        self.assertIsNone(cache.get(RECENT_THREADS_KEY))
+        self.assertEqual(Thread.objects.get_recent_ids(self.date_limit)[0], self.threads[1].pk)
+
+        self.threads[1].delete()
+        self.assertNotIn(self.threads[1].pk, Thread.objects.get_recent_ids(self.date_limit))
+
+    def test_old_threads(self):
+        # Fixture threads were active in 2015
+        date_limit = datetime.datetime(2015, 1, 1)
+        self.assertEqual(len(Thread.objects.get_recent_ids(self.date_limit)), 3)
+        self.assertEqual(len(Thread.objects.get_recent_ids(date_limit)), Thread.objects.count())
+
+    def test_latests(self):
+        Message.objects.create(author=self.user, thread=self.threads[1], text='Hello again')
+        response = self.client.get(reverse('board_latests'))
+        self.assertListEqual([thread.pk for thread in response.context['thread_list']],
+                             [self.threads[1].pk, self.threads[2].pk, self.threads[0].pk])
+
+
+class ThreadPurgeTests(TestCase):
+    fixtures = ['devel']
+
+    def setUp(self):
+        cache.clear()
+        self.users = list(ActiveUser.objects.order_by('pk')[:2])
+
+    def create_thread(self, number):
+        thread = Thread(title='Hello World!')
+        thread.save()
+        for i in range(number):
+            message = Message(author=self.users[i % 2], thread=thread, text='Hello %d' % i)
+            message.save()
+            if i % 3 == 0:
+                message.modify(self.users[0], 'Hello again %d' % i)
+        for user in self.users:
+            Flag.objects.read(user, message)
+        return thread
+
+    def count_queries(self, thread):
+        with CaptureQueriesContext(connection) as context:
+            Thread.objects.filter(pk=thread.pk).purge()
+        return len(context)
+
+    def test_purge(self):
+        thread = self.create_thread(10)
+        other = self.create_thread(3)
+        BlogBoardLink(thread=thread, post=BlogPost.objects.first()).save()
+        message_ids = list(Message.objects.filter(thread=thread).values_list('pk', flat=True))
+        self.assertIn(thread.pk, Thread.objects.get_recent_ids(datetime.datetime(2015, 1, 1)))
+
+        self.assertEqual(Thread.objects.filter(pk=thread.pk).purge(), 10)
+
+        self.assertFalse(Thread.objects.filter(pk=thread.pk).exists())
+        self.assertFalse(Message.objects.filter(pk__in=message_ids).exists())
+        for model in [Flag, ThreadAuthor, BlogBoardLink]:
+            self.assertFalse(model.objects.filter(thread=thread.pk).exists(), model)
+        self.assertFalse(MessageHistory.objects.filter(message__in=message_ids).exists())
+
+        # Other thread, counters and recent threads are consistent
+        self.assertEqual(Message.objects.filter(thread=other).count(), 3)
+        stats = dict(AuthorStats.objects.values_list('author', 'number'))
+        for user in self.users:
+            self.assertEqual(stats[user.pk], Message.objects.filter(author=user).count())
+        self.assertNotIn(thread.pk, Thread.objects.get_recent_ids(datetime.datetime(2015, 1, 1)))
+
+    def test_search_index(self):
+        small, thread = self.create_thread(4), self.create_thread(120)
+        call_command('update_search_index', stdout=StringIO())
+        backend = get_backend()
+        message_ids = list(Message.objects.filter(thread=thread).values_list('pk', flat=True))
+
+        messages = SearchDocument.objects.filter(content_type=backend.get_content_type(SEARCH[0]), object_id__in=message_ids)
+        threads = SearchDocument.objects.filter(content_type=backend.get_content_type(SEARCH[1]), object_id=thread.pk)
+        self.assertEqual(messages.count(), 120)
+        self.assertTrue(threads.exists())
+
+        # The documents are not deleted by batches
+        self.assertEqual(self.count_queries(thread), self.count_queries(small))
+        self.assertFalse(messages.exists())
+        self.assertFalse(threads.exists())
+        self.assertFalse(SearchTerm.objects.exclude(document__in=SearchDocument.objects.values('pk')).exists())
+
+    def test_queries(self):
+        # Number of queries does not depend on the number of messages
+        expected = self.count_queries(self.create_thread(5))
+        self.assertEqual(self.count_queries(self.create_thread(50)), expected)
+
+    def test_delete_view(self):
+        thread = self.create_thread(3)
+        self.client.login(username='admin', password='admin')
+        response = self.client.get(reverse('board_thread_delete', kwargs={'thread': thread.pk}))
+        self.assertRedirects(response, reverse('board_latests'), fetch_redirect_response=False)
+        self.assertFalse(Thread.objects.filter(pk=thread.pk).exists())
+
+
+class ThreadListQueriesTests(TestCase):
+    """
+    The number of queries needed to display a list of threads should not depend on
+    the number of threads.
+    """
+    fixtures = ['devel']
+
+    def setUp(self):
+        self.user = ActiveUser.objects.get(username='user1')
+        self.client.login(username='user1', password='user1')
+
+    def create_threads(self, number):
+        for i in range(number):
+            thread = Thread(title='Hello World %d!' % i)
+            thread.save()
+            for author in ActiveUser.objects.all():
+                message = Message(author=author, thread=thread, text='Hello World!')
+                message.save()
+            Flag.objects.read(self.user, message)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def assertConstantQueries(self, url):
+        self.create_threads(2)
+        expected = self.count_queries(url)
+        self.create_threads(5)
+        self.assertEqual(self.count_queries(url), expected)
+
+    def test_latests(self):
+        self.assertConstantQueries(reverse('board_latests'))
+
+    def test_archives(self):
+        self.assertConstantQueries(reverse('board_archives'))
+
+    def test_followed(self):
+        self.assertConstantQueries(reverse('board_followed'))
+
+    def test_followed_flags(self):
+        self.create_threads(3)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('board_followed'))
+        # The listed flags are not fetched again to annotate their threads
+        queries = [query['sql'] for query in context.captured_queries if 'FROM "board_flag"' in query['sql']]
+        self.assertEqual(len([sql for sql in queries if 'COUNT(' not in sql]), 1)
+        for thread in response.context['thread_list']:
+            self.assertEqual(thread.flag, Flag.objects.get(thread=thread, user=self.user))
+
+    def test_annotate_threads(self):
+        self.create_threads(3)
+        threads = Thread.objects.all()
+        with self.assertNumQueries(2):
+            threads = Flag.objects.annotate_threads(threads, self.user)
+        for thread in threads:
+            expected = Flag.objects.filter(thread=thread, user=self.user).first()
+            self.assertEqual(getattr(thread, 'flag', None), expected)
+
+
+class KeysetPaginationTests(TestCase):
+    fixtures = ['devel']
+
+    def setUp(self):
+        cache.clear()
+        self.user = ActiveUser.objects.get(username='user1')
+        self.thread = Thread(title='Hello World!')
+        self.thread.save()
+        for i in range(45):
+            Message(author=self.user, thread=self.thread, text='Hello %d' % i).save()
+        # Some messages share the same date, ties are broken by pk
+        messages = Message.objects.filter(thread=self.thread)
+        date = messages[10].date
+        Message.objects.filter(pk__in=[x.pk for x in messages[10:20]]).update(date=date)
+        self.queryset = Message.objects.all()
+        self.expected = Paginator(self.queryset.order_by('date', 'pk'), 7, orphans=2)
+
+    def test_pages_without_cursor(self):
+        paginator = KeysetPaginator(self.queryset, 7, orphans=2)
+        self.assertEqual(paginator.num_pages, self.expected.num_pages)
+        for number in self.expected.page_range:
+            self.assertListEqual(paginator.page(number).object_list, list(self.expected.page(number).object_list))
+
+    def test_pages_with_cursor(self):
+        for number in self.expected.page_range:
+            page = KeysetPaginator(self.queryset, 7, orphans=2).page(number)
+            self.assertTrue(page.cursors)
+            for other, cursor in page.cursors.items():
+                other_page = KeysetPaginator(self.queryset, 7, orphans=2, cursor=cursor).page(other)
+                self.assertListEqual(other_page.object_list, list(self.expected.page(other).object_list))
+
+    def test_obsolete_cursor(self):
+        for cursor in ['-1', 'abc']:
+            page = KeysetPaginator(self.queryset, 7, orphans=2, cursor=cursor).page(3)
+            self.assertListEqual(page.object_list, list(self.expected.page(3).object_list))
+
+    def test_sequence_paginator(self):
+        queryset = Message.objects.filter(thread=self.thread)
+        expected = Paginator(queryset, MESSAGES_PER_THREADPAGE)
+        paginator = SequencePaginator(queryset, MESSAGES_PER_THREADPAGE, key='sequence', count=self.thread.number)
+        self.assertEqual(paginator.num_pages, expected.num_pages)
+        for number in expected.page_range:
+            with self.assertNumQueries(1):
+                page = paginator.page(number)
+            self.assertListEqual(page.object_list, list(expected.page(number).object_list))
+
+    def test_outdated_count(self):
+        queryset = Message.objects.filter(thread=self.thread)
+        paginator = SequencePaginator(queryset, 10, key='sequence', count=self.thread.number + 30)
+        with self.assertRaises(EmptyPage):
+            paginator.page(6)
+
+        Thread.objects.filter(pk=self.thread.pk).update(number=F('number') + 30)
+        url = reverse('board_thread_show', kwargs={'thread': self.thread.pk, 'slug': self.thread.slug, 'page': 6})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 404)
+
+    def test_archives_count(self):
+        url = reverse('board_archives_messages', kwargs={'page': 1})
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url)
+        self.assertFalse([query for query in context.captured_queries if 'COUNT(' in query['sql']])
+
+        Message(author=self.user, thread=self.thread, text='Hello').save()
+        response = self.client.get(url)
+        self.assertEqual(response.context['paginator'].count, Message.objects.count())
+
+    def test_archives_view(self):
+        Message.objects.bulk_create([Message(author=self.user, thread=self.thread, text='Hello', sequence=45 + i) for i in range(60)])
+        url = reverse('board_archives_messages', kwargs={'page': 1})
+        response = self.client.get(url)
+        cursor = response.context['page_obj'].cursors[2]
+        self.assertContains(response, '?cursor={}'.format(cursor))
+
+        url = reverse('board_archives_messages', kwargs={'page': 2})
+        expected = self.client.get(url).context['message_list']
+        response = self.client.get(url, {'cursor': cursor})
+        self.assertListEqual(response.context['message_list'], expected)
+
 
 class APITests(TestCase):
     fixtures = ['devel']
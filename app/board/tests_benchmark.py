@@ -0,0 +1,70 @@
+import datetime
+
+from django.core.paginator import Paginator
+from django.utils import timezone
+
+from helpers.benchmark import LexpageBenchmarkTestCase
+from helpers.paginator import KeysetPaginator, SequencePaginator
+from profile.models import ActiveUser
+from board.models import Thread, Message
+from board.views import MESSAGES_PER_PAGE, MESSAGES_PER_THREADPAGE
+
+
+class PaginationBenchmark(LexpageBenchmarkTestCase):
+    fixtures = ['devel']
+    size = 30000
+    depth = 15000
+
+    @classmethod
+    def setUpTestData(cls):
+        user = ActiveUser.objects.get(username='user1')
+        cls.thread = Thread(title='Hello World!', number=cls.size)
+        cls.thread.save()
+        start = timezone.now()
+        Message.objects.bulk_create(
+            [Message(author=user, thread=cls.thread, text='Hello %d' % i, sequence=i,
+                     date=start + datetime.timedelta(seconds=i)) for i in range(cls.size)],
+            batch_size=500
+        )
+
+    def compare(self, title, shallow, deep):
+        shallow_time, deep_time = self.timeit(shallow), self.timeit(deep)
+        with self.report(title) as lines:
+            lines.append('shallow page: {:.2f}ms'.format(shallow_time * 1000))
+            lines.append('deep page:    {:.2f}ms (depth {})'.format(deep_time * 1000, self.depth))
+        return shallow_time, deep_time
+
+    def test_archives(self):
+        queryset = Message.objects.all()
+        number = self.depth // MESSAGES_PER_PAGE
+        expected = Paginator(queryset.order_by('date', 'pk'), MESSAGES_PER_PAGE)
+        cursors = {n: expected.page(n).object_list[0].pk for n in [2, number]}
+
+        def fetch(paginator_class, number, **kwargs):
+            # Objects are counted as in the view: by Paginator for OFFSET, from the cache for keyset
+            def func():
+                if paginator_class is KeysetPaginator:
+                    kwargs['count'] = Message.objects.get_total_count()
+                paginator = paginator_class(queryset, MESSAGES_PER_PAGE, **kwargs)
+                return list(paginator.page(number).object_list)
+            return func
+
+        self.compare('Archives, OFFSET', fetch(Paginator, 2), fetch(Paginator, number))
+        shallow, deep = self.compare('Archives, keyset',
+                                     fetch(KeysetPaginator, 2, cursor=cursors[2]),
+                                     fetch(KeysetPaginator, number, cursor=cursors[number]))
+        self.assertLess(deep, shallow * 3)
+
+    def test_thread(self):
+        queryset = Message.objects.filter(thread=self.thread)
+        number = self.depth // MESSAGES_PER_THREADPAGE
+
+        def fetch(paginator_class, number, **kwargs):
+            # Objects are counted as in the view: by Paginator for OFFSET, from Thread.number for sequence
+            return lambda: list(paginator_class(queryset, MESSAGES_PER_THREADPAGE, **kwargs).page(number).object_list)
+
+        self.compare('Thread, OFFSET', fetch(Paginator, 2), fetch(Paginator, number))
+        shallow, deep = self.compare('Thread, sequence',
+                                     fetch(SequencePaginator, 2, key='sequence', count=self.size),
+                                     fetch(SequencePaginator, number, key='sequence', count=self.size))
+        self.assertLess(deep, shallow * 3)
@@ -4,7 +4,7 @@ from .views import ThreadView, ThreadUnreadRedirectView, ThreadReplyView, \
                 ThreadMarkUnreadView, ThreadDeleteView, ThreadCreateView, \
                 MessageRedirectView, MessageEditView, \
                 MessageDeleteView, MessageMarkUnreadView, \
-                BoardLatestsView, BoardArchivesView, BoardArchivesMessagesView, \
+                BoardLatestsView, BoardMarkReadView, BoardArchivesView, BoardArchivesMessagesView, \
                 ThreadCreateForPostView, FollowedView
 
 from .feeds import LatestsFeed
@@ -82,6 +82,9 @@ urlpatterns = [
                 url(r'^$',
                     BoardLatestsView.as_view(),
                     name='board_latests'),
+                url(r'^mark_read/$',
+                    BoardMarkReadView.as_view(),
+                    name='board_mark_read'),
                 url(r'^archives/$',
                     BoardArchivesView.as_view(),
                     {'page': 'last'},
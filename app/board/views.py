@@ -15,6 +15,7 @@ from django.contrib import messages
 
 from notifications.models import Notification
 from blog.models import BlogPost
+from helpers.paginator import KeysetPaginator, SequencePaginator
 
 from .models import Message, Thread, Flag, MessageHistory, BlogBoardLink
 from .forms import MessageForm, MessageModerateForm, ThreadForm
@@ -40,10 +41,16 @@ class ThreadView(ListView):
     allow_empty = False
     queryset = None
     paginate_by = MESSAGES_PER_THREADPAGE
+    paginator_class = SequencePaginator
 
     def get_queryset(self):
-        self.thread = get_object_or_404(Thread.objects, pk=self.kwargs['thread'])
-        return Message.objects.all().filter(thread=self.thread)
+        self.thread = get_object_or_404(Thread.objects.select_related('blogboardlink__post__author__profile'),
+                                        pk=self.kwargs['thread'])
+        return Message.objects.all().filter(thread=self.thread).with_authors().with_history()
+
+    def get_paginator(self, *args, **kwargs):
+        kwargs.update(key='sequence', count=self.thread.number)
+        return ListView.get_paginator(self, *args, **kwargs)
 
     def get_context_data(self, **kwargs):
         context = ListView.get_context_data(self, **kwargs)
@@ -54,12 +61,16 @@ class ThreadView(ListView):
 
         # Do we need to display the last message of the previous page?
         if context['page_obj'].has_previous:
-            previous_message = context['message_list'][0].previous_message()
+            first = context['message_list'][0]
+            previous_message = (Message.objects.filter(thread=self.thread, sequence__lt=first.sequence)
+                                .with_authors().with_history().order_by('-sequence').first())
             context['previous'] = previous_message
 
-        # Update flag if needed
-        last_index = len(context['message_list']) - 1
-        Flag.objects.read(self.request.user, context['message_list'][last_index])
+        # Update flag if needed, the current one is known since annotate_flag
+        last_message = context['message_list'][len(context['message_list']) - 1]
+        flag = getattr(self.thread, 'flag', None)
+        if flag is None or flag.message.date < last_message.date:
+            Flag.objects.read(self.request.user, last_message)
 
         # Display form if needed
         if self.request.user.is_authenticated():
@@ -79,11 +90,12 @@ class ThreadUnreadRedirectView(RedirectView):
 
     def get_redirect_url(self, **kwargs):
         # Last read message
-        message = get_object_or_404(Flag.objects, thread=kwargs['thread'], user=self.request.user).message
+        message = get_object_or_404(Flag.objects.select_related('message__thread'),
+                                    thread=kwargs['thread'], user=self.request.user).message
         position = message.position()
 
         # If the last read is the last message (ie. "doubleclick" on flag)
-        if message == message.thread.last_message:
+        if message.pk == message.thread.last_message_id:
             pass
         else:
             # First new message is at position + 1
@@ -160,7 +172,7 @@ class ThreadDeleteView(RedirectView):
     def get_redirect_url(self, **kwargs):
         thread = get_object_or_404(Thread.objects, pk=kwargs['thread'])
         if self.request.user.has_perm('board.can_destroy'):
-            thread.delete()
+            Thread.objects.filter(pk=thread.pk).purge()
             messages.success(self.request, "La discussion a été supprimée.")
             return reverse_lazy('board_latests')
         else:
@@ -260,7 +272,7 @@ class MessageRedirectView(RedirectView):
     permanent = False
 
     def get_redirect_url(self, **kwargs):
-        message = get_object_or_404(Message.objects, pk=kwargs['message'])
+        message = get_object_or_404(Message.objects.select_related('thread'), pk=kwargs['message'])
         position = message.position()
         page = (position // MESSAGES_PER_THREADPAGE) + 1
         return reverse('board_thread_show',
@@ -388,21 +400,40 @@ class MessageMarkUnreadView(RedirectView):
         return reverse_lazy('board_latests')
 
 
+def get_latest_threads():
+    """
+    Return the threads that were active during the last LATESTS_IN_DAYS days.
+    """
+    date_limit = datetime.date.today() - datetime.timedelta(LATESTS_IN_DAYS)
+    date_limit = datetime.datetime(date_limit.year, date_limit.month, date_limit.day)
+    return Thread.objects.active_since(date_limit)
+
+
 class BoardLatestsView(ListView):
     """
-    List of latest threads (by message date).
+    List of latest threads, most recently active first.
     """
     template_name = 'board/latests.html'
     context_object_name = 'thread_list'
     queryset = None
 
     def get_queryset(self):
-        date_limit = datetime.date.today() - datetime.timedelta(LATESTS_IN_DAYS)
-        date_limit = datetime.datetime(date_limit.year, date_limit.month, date_limit.day)
-        threads = Thread.objects.all().filter(last_message__date__gte=date_limit).order_by('-date_created')
-        for thread in threads:
-            thread.annotate_flag(self.request.user)
-        return threads
+        threads = get_latest_threads().with_authors().with_last_message()
+        return Flag.objects.annotate_threads(threads, self.request.user)
+
+
+class BoardMarkReadView(RedirectView):
+    """
+    Mark every latest thread as read and redirect.
+    """
+    permanent = False
+
+    dispatch = method_decorator(login_required)(RedirectView.dispatch)
+
+    def get_redirect_url(self, **kwargs):
+        Flag.objects.read_threads(self.request.user, get_latest_threads().only('pk', 'last_message'))
+        messages.success(self.request, "Les discussions actives ont été marquées comme lues.")
+        return reverse_lazy('board_latests')
 
 
 class BoardArchivesView(ListView):
@@ -412,14 +443,13 @@ class BoardArchivesView(ListView):
     template_name = 'board/archives.html'
     context_object_name = 'thread_list'
     allow_empty = True
-    queryset = Thread.objects.all()
+    queryset = Thread.objects.with_authors().with_last_message()
     paginate_by = THREADS_PER_PAGE
     paginate_orphans = THREADS_PER_PAGE // 5
 
     def paginate_queryset(self, queryset, page_size):
         (paginator, page, object_list, is_paginated) = ListView.paginate_queryset(self, queryset, page_size)
-        for thread in object_list:
-            thread.annotate_flag(self.request.user)
+        object_list = Flag.objects.annotate_threads(object_list, self.request.user)
         return paginator, page, object_list, is_paginated
 
 
@@ -430,9 +460,15 @@ class BoardArchivesMessagesView(ListView):
     template_name = 'board/archives_messages.html'
     context_object_name = 'message_list'
     allow_empty = True
-    queryset = Message.objects.all()
+    queryset = Message.objects.all().select_related('thread', 'author')
     paginate_by = MESSAGES_PER_PAGE
     paginate_orphans = MESSAGES_PER_PAGE // 5
+    paginator_class = KeysetPaginator
+
+    def get_paginator(self, *args, **kwargs):
+        kwargs['cursor'] = self.request.GET.get('cursor', None)
+        kwargs['count'] = Message.objects.get_total_count()
+        return ListView.get_paginator(self, *args, **kwargs)
 
 
 class FollowedView(ListView):
@@ -456,7 +492,9 @@ class FollowedView(ListView):
         return ListView.dispatch(self, *args, **kwargs)
 
     def get_queryset(self):
-        queryset = Flag.objects.all().filter(user=self.request.user)
+        queryset = Flag.objects.all().filter(user=self.request.user).select_related('thread__last_message__author',
+                                                                                    'message')
+        queryset = queryset.prefetch_related('thread__thread_authors')
         if self.filter_unread:
             queryset = queryset.exclude(message=F('thread__last_message'))
         return queryset.order_by('thread__date_created')
@@ -468,7 +506,9 @@ class FollowedView(ListView):
 
     def paginate_queryset(self, queryset, page_size):
         (paginator, page, object_list, is_paginated) = ListView.paginate_queryset(self, queryset, page_size)
-        object_list = [x.thread for x in object_list]
-        for thread in object_list:
-            thread.annotate_flag(self.request.user)
-        return (paginator, page, object_list, is_paginated)
+        # The flags of the user are the listed objects, no need to annotate the threads
+        threads = []
+        for flag in object_list:
+            flag.thread.flag = flag
+            threads.append(flag.thread)
+        return (paginator, page, threads, is_paginated)
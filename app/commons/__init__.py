@@ -1 +1 @@
-
+default_app_config = 'commons.config.CommonsConfig'
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+class CommonsConfig(AppConfig):
+    name = 'commons'
+    verbose_name = 'Commons'
+
+    def ready(self):
+        import commons.signals
@@ -19,4 +19,6 @@ def global_settings(request=None):
 
         'THEMES': settings.THEMES,
         'ANALYTICS': settings.ANALYTICS,
+        'NOTIFICATIONS_PUSH': settings.NOTIFICATIONS_PUSH,
+        'MINICHAT_PUSH': settings.MINICHAT_PUSH,
     }
@@ -1,7 +1,5 @@
-from datetime import datetime
-
 from helpers.request import is_incognito
-from profile.models import Profile
+from profile.visits import record_visit
 
 
 class SetLastVisitMiddleware():
@@ -10,5 +8,5 @@ class SetLastVisitMiddleware():
             # We ignore status code 302 so the last_visit is not updated at the login page redirect
             # Without this, when a user would log in, the last_visit datetime would be the login
             # time and not the time we reach the home page.
-            Profile.objects.filter(user=request.user).update(last_visit=datetime.now())
+            record_visit(request.user)
         return response
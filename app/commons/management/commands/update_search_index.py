@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from commons.models import SearchDocument
+from commons.search import SEARCH
+from commons.search_backends import get_backend
+
+
+class Command(BaseCommand):
+    help = "Index every object targeted by the search, and remove obsolete entries from the index."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of objects indexed in each transaction.')
+
+    def update_target(self, search_cfg, batch_size):
+        """
+        Index the objects of given search target and return their number.
+        """
+        backend = get_backend()
+        objects = search_cfg['manager'].model._base_manager.order_by('pk')
+        last_pk = 0
+        indexed = 0
+
+        while True:
+            batch = list(objects.filter(pk__gt=last_pk).select_related(*search_cfg['select_related'])[:batch_size])
+            if len(batch) == 0:
+                break
+
+            with transaction.atomic():
+                for instance in batch:
+                    backend.index(search_cfg, instance)
+
+            indexed += len(batch)
+            last_pk = batch[-1].pk
+
+        content_type = backend.get_content_type(search_cfg)
+        SearchDocument.objects.filter(content_type=content_type).exclude(object_id__in=objects.values('pk')).delete()
+        return indexed
+
+    def handle(self, *args, **options):
+        for search_cfg in SEARCH:
+            indexed = self.update_target(search_cfg, options['batch_size'])
+            self.stdout.write('%s: %d objects indexed.' % (search_cfg['title'], indexed))
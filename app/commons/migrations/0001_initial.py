@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.8 on 2026-10-18 12:11
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_fulltext_index(apps, schema_editor):
+    # Used by commons.search_backends.PostgreSQLBackend
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("CREATE INDEX commons_searchdocument_text_fts ON commons_searchdocument "
+                              "USING gin(to_tsvector('french', text))")
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX commons_searchdocument_text_fts")
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('text', models.TextField(verbose_name='Contenu')),
+                ('author', models.CharField(blank=True, max_length=255, verbose_name='Auteur')),
+                ('date', models.DateTimeField(blank=True, null=True, verbose_name='Date')),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.ContentType')),
+            ],
+            options={
+                'verbose_name': 'Document indexé',
+                'verbose_name_plural': 'Documents indexés',
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='Terme')),
+                ('frequency', models.IntegerField(default=1, verbose_name='Occurrences')),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='commons.SearchDocument')),
+            ],
+            options={
+                'verbose_name': 'Terme indexé',
+                'verbose_name_plural': 'Termes indexés',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='searchterm',
+            unique_together=set([('term', 'document')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='searchdocument',
+            unique_together=set([('content_type', 'object_id')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='searchdocument',
+            index_together=set([('content_type', 'date')]),
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
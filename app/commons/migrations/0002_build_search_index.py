@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from collections import Counter
+
+from django.conf import settings
+from django.db import migrations
+
+
+def build_search_index(apps, schema_editor):
+    from commons.search import SEARCH, get_document, tokenize
+    from commons.search_backends import get_backend, InvertedIndexBackend
+
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    SearchDocument = apps.get_model('commons', 'SearchDocument')
+    SearchTerm = apps.get_model('commons', 'SearchTerm')
+    with_terms = isinstance(get_backend(), InvertedIndexBackend)
+    max_length = SearchTerm._meta.get_field('term').max_length
+
+    # Same documents as the update_search_index command, built from the historical models
+    for search_cfg in SEARCH:
+        opts = search_cfg['manager'].model._meta.concrete_model._meta
+        content_type, created = ContentType.objects.get_or_create(app_label=opts.app_label, model=opts.model_name)
+        model = apps.get_model(opts.app_label, opts.model_name)
+        indexed = SearchDocument.objects.filter(content_type=content_type)
+        objects = model._base_manager.exclude(pk__in=indexed.values('object_id')).order_by('pk')
+
+        last_pk = 0
+        while True:
+            batch = list(objects.filter(pk__gt=last_pk).select_related(*search_cfg['select_related'])[:500])
+            if len(batch) == 0:
+                break
+            last_pk = batch[-1].pk
+
+            documents = {instance.pk: get_document(search_cfg, instance) for instance in batch}
+            SearchDocument.objects.bulk_create([SearchDocument(content_type=content_type, object_id=pk, **document)
+                                                for pk, document in documents.items()])
+            if with_terms:
+                terms = []
+                for document_id, object_id in indexed.filter(object_id__in=documents.keys()).values_list('pk', 'object_id'):
+                    frequencies = Counter(term[:max_length] for term in tokenize(documents[object_id]['text']))
+                    terms.extend(SearchTerm(document_id=document_id, term=term, frequency=frequency)
+                                 for term, frequency in frequencies.items())
+                SearchTerm.objects.bulk_create(terms, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commons', '0001_initial'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('blog', '0002_blogpost_html'),
+        ('board', '0008_message_sequence_unique'),
+        ('minichat', '0001_initial'),
+        ('slogan', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
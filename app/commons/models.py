@@ -0,0 +1,40 @@
+from django.db import models
+from django.contrib.contenttypes.models import ContentType
+
+
+class SearchDocument(models.Model):
+    """
+    Searchable content of an object, as defined by its entry in commons.search.SEARCH.
+    Maintained by commons.signals, see also the update_search_index command.
+    """
+    content_type = models.ForeignKey(ContentType, related_name='+')
+    object_id = models.PositiveIntegerField()
+    text = models.TextField(verbose_name='Contenu')
+    author = models.CharField(verbose_name='Auteur', max_length=255, blank=True)
+    date = models.DateTimeField(verbose_name='Date', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Document indexé'
+        verbose_name_plural = 'Documents indexés'
+        unique_together = (('content_type', 'object_id'),)
+        index_together = (('content_type', 'date'),)
+
+    def __str__(self):
+        return '{} #{}'.format(self.content_type, self.object_id)
+
+
+class SearchTerm(models.Model):
+    """
+    Entry of the inverted index used by commons.search_backends.InvertedIndexBackend.
+    """
+    term = models.CharField(verbose_name='Terme', max_length=64)
+    document = models.ForeignKey(SearchDocument, related_name='terms')
+    frequency = models.IntegerField(verbose_name='Occurrences', default=1)
+
+    class Meta:
+        verbose_name = 'Terme indexé'
+        verbose_name_plural = 'Termes indexés'
+        unique_together = (('term', 'document'),)
+
+    def __str__(self):
+        return self.term
@@ -5,12 +5,13 @@ import minichat.models
 import slogan.models
 
 import re
-from django.db.models import Q
+import unicodedata
 
 
 SEARCH = [{
     'title': 'Discussions - Messages',
     'manager': board.models.Message.objects,
+    'select_related': ['thread', 'author'],
     'search_fields': ['text', ],
     'author_field': 'author__username',
     'date_field': 'date',
@@ -21,6 +22,7 @@ SEARCH = [{
 }, {
     'title': 'Discussions - Titres',
     'manager': board.models.Thread.objects,
+    'select_related': ['last_message'],
     'search_fields': ['title', ],
     'author_field': None,
     'date_field': 'date_created',
@@ -31,6 +33,7 @@ SEARCH = [{
 }, {
     'title': 'Billets',
     'manager': blog.models.BlogPost.published,
+    'select_related': ['author'],
     'search_fields': ['title', 'abstract', 'text'],
     'author_field': 'author__username',
     'date_field': 'date_published',
@@ -41,6 +44,7 @@ SEARCH = [{
 }, {
     'title': 'Minichat',
     'manager': minichat.models.Message.objects,
+    'select_related': ['user'],
     'search_fields': ['text'],
     'author_field': 'user__username',
     'date_field': 'date',
@@ -51,6 +55,7 @@ SEARCH = [{
 }, {
     'title': 'Slogans',
     'manager': slogan.models.Slogan.visible,
+    'select_related': [],
     'search_fields': ['slogan'],
     'author_field': 'author',
     'date_field': 'date',
@@ -61,6 +66,7 @@ SEARCH = [{
 }, {
     'title': 'Lexpagiens',
     'manager': profile.models.ActiveUser.objects,
+    'select_related': [],
     'search_fields': ['username', ],
     'author_field': 'username',
     'date_field': 'date_joined',
@@ -87,42 +93,41 @@ def normalize_query(query_string, findterms=None, normspace=None):
     return [normspace(' ', (t[0] or t[1]).strip()) for t in findterms(query_string)]
 
 
-def get_query(query_string, search_fields):
-    """ Returns a query, that is a combination of Q objects. That combination
-        aims to search keywords within a model by testing the given search fields.
-
+def tokenize(text):
     """
-    query = None  # Query to search for every search term
-    terms = normalize_query(query_string)
-    for term in terms:
-        or_query = None  # Query to search for a given term in each field
-        for field_name in search_fields:
-            q = Q(**{"%s__icontains" % field_name: term})
-            if or_query is None:
-                or_query = q
-            else:
-                or_query = or_query | q
-        if query is None:
-            query = or_query
-        else:
-            query = query & or_query
-    return query
-
+    Split given text into lowercase, unaccented words.
 
-def get_query_for_fields(search_cfg, query_text):
-    fields = search_cfg['search_fields']
-    return get_query(query_text, fields)
+    >>> tokenize('Une belle Journée, à Liège !')
+    ['une', 'belle', 'journee', 'a', 'liege']
+    """
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return re.findall(r'\w+', text)
 
 
-def get_query_for_author(search_cfg, query_text):
-    field = search_cfg['author_field']
-    if not field or query_text == '':
-        return Q()
-    return Q(**{'%s__icontains' % field: query_text})
+def get_value(instance, path):
+    """
+    Follow given lookup path (eg. 'author__username') from instance, and return
+    the value that is found, or None.
+    """
+    value = instance
+    for name in path.split('__'):
+        value = getattr(value, name, None)
+        if value is None:
+            return None
+    return value
 
 
-def get_query_for_date(search_cfg, date_start, date_end):
-    field = search_cfg['date_field']
-    return Q(**{'%s__gte' % field: date_start,
-                '%s__lte' % field: date_end})
+def get_document(search_cfg, instance):
+    """
+    Return the searchable content of instance, as a dict with 'text', 'author'
+    and 'date' keys.
+    """
+    texts = [get_value(instance, field) for field in search_cfg['search_fields']]
+    author = get_value(instance, search_cfg['author_field']) if search_cfg['author_field'] else None
+    return {
+        'text': '\n'.join(str(x) for x in texts if x),
+        'author': str(author) if author else '',
+        'date': get_value(instance, search_cfg['date_field']),
+    }
 
@@ -0,0 +1,189 @@
+"""
+Search backends, see SEARCH_BACKEND setting.
+
+A backend maintains an index of the objects targeted by commons.search.SEARCH (this
+index is updated by commons.signals), and answers queries with a queryset of
+(object_id, score) pairs, ordered by decreasing relevance.
+"""
+import math
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Case, When, Count, Sum, F, Value, FloatField, ExpressionWrapper
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from helpers.queryset import raw_delete
+
+from .models import SearchDocument, SearchTerm
+from .search import normalize_query, tokenize, get_document
+
+
+_backend = None
+
+
+def get_backend():
+    """
+    Return an instance of the backend defined by SEARCH_BACKEND.
+    """
+    global _backend
+    if _backend is None:
+        _backend = import_string(settings.SEARCH_BACKEND)()
+    return _backend
+
+
+class BaseSearchBackend:
+    def get_content_type(self, search_cfg):
+        return ContentType.objects.get_for_model(search_cfg['manager'].model)
+
+    def index(self, search_cfg, instance):
+        """
+        Add or update given instance in the index.
+        :param search_cfg: entry of commons.search.SEARCH
+        :param instance: object to index
+        :return: the SearchDocument of instance
+        """
+        document, created = SearchDocument.objects.update_or_create(
+            content_type=self.get_content_type(search_cfg),
+            object_id=instance.pk,
+            defaults=get_document(search_cfg, instance)
+        )
+        return document
+
+    def remove(self, search_cfg, instance):
+        """
+        Remove given instance from the index.
+        """
+        self.remove_many(search_cfg, [instance.pk])
+
+    def remove_many(self, search_cfg, object_ids):
+        """
+        Remove the objects with given ids from the index.
+        :param object_ids: a list of ids, or a queryset of ids (eg. using values('pk'))
+        """
+        documents = SearchDocument.objects.filter(content_type=self.get_content_type(search_cfg),
+                                                  object_id__in=object_ids)
+        with transaction.atomic():
+            SearchTerm.objects.filter(document__in=documents).delete()
+            # Documents are referenced by their terms, so QuerySet.delete() would load them
+            # and delete them by batches, while the terms are already deleted
+            raw_delete(documents)
+
+    def get_terms(self, query_text):
+        """
+        Return the terms of given query, each term being a list of words.
+        Terms that contain several words are phrases, that must appear as is.
+        """
+        terms = [tokenize(term) for term in normalize_query(query_text)]
+        return [term for term in terms if len(term) > 0]
+
+    def filter_documents(self, documents, search_cfg, query_text, author, date_start, date_end, prefix=''):
+        """
+        Apply the filters that are common to every backend on a queryset of
+        SearchDocument (or on a queryset of a model having a relation to SearchDocument,
+        in which case prefix should be set accordingly, eg. 'document__').
+        """
+        lookups = {
+            'content_type': self.get_content_type(search_cfg),
+            # Only keep objects that are visible through the manager (eg. published blog posts)
+            'object_id__in': search_cfg['manager'].all().values('pk'),
+        }
+        if date_start:
+            lookups['date__gte'] = date_start
+        if date_end:
+            lookups['date__lte'] = date_end
+        if search_cfg['author_field'] and author:
+            lookups['author__icontains'] = author
+        documents = documents.filter(**{prefix + k: v for k, v in lookups.items()})
+
+        # Phrases must appear as is
+        for phrase in normalize_query(query_text):
+            if len(tokenize(phrase)) > 1:
+                documents = documents.filter(**{prefix + 'text__icontains': phrase})
+        return documents
+
+    def search(self, search_cfg, query_text, author='', date_start=None, date_end=None):
+        """
+        Return a queryset of (object_id, score) pairs for the objects that match
+        given query, ordered by decreasing score.
+        :param search_cfg: entry of commons.search.SEARCH
+        :param query_text: searched terms
+        :param author: (part of) the name of the author, if any
+        :param date_start: only return objects that are more recent than this date
+        :param date_end: only return objects that are older than this date
+        """
+        raise NotImplementedError()
+
+
+class InvertedIndexBackend(BaseSearchBackend):
+    """
+    Portable backend that stores an inverted index (SearchTerm) in the database.
+    Every word of the query must be found, objects are ranked by tf-idf.
+    """
+    def index(self, search_cfg, instance):
+        with transaction.atomic():
+            document = super().index(search_cfg, instance)
+
+            frequencies = Counter(term[:SearchTerm._meta.get_field('term').max_length] for term in tokenize(document.text))
+            current = dict(document.terms.values_list('term', 'frequency'))
+
+            removed = [term for term in current if term not in frequencies]
+            if removed:
+                document.terms.filter(term__in=removed).delete()
+            for term, frequency in frequencies.items():
+                if term in current and current[term] != frequency:
+                    document.terms.filter(term=term).update(frequency=frequency)
+            SearchTerm.objects.bulk_create(
+                [SearchTerm(term=term, document=document, frequency=frequency)
+                 for term, frequency in frequencies.items() if term not in current]
+            )
+        return document
+
+    def search(self, search_cfg, query_text, author='', date_start=None, date_end=None):
+        words = set(word for term in self.get_terms(query_text) for word in term)
+        content_type = self.get_content_type(search_cfg)
+
+        # Inverse document frequencies
+        frequencies = dict(
+            SearchTerm.objects.filter(term__in=words, document__content_type=content_type)
+            .values_list('term').annotate(Count('document'))
+        )
+        if len(words) == 0 or len(frequencies) < len(words):
+            return SearchTerm.objects.none().values_list('document__object_id', 'frequency')
+        total = SearchDocument.objects.filter(content_type=content_type).count()
+        weights = {word: math.log(1 + total / frequency) for word, frequency in frequencies.items()}
+
+        terms = SearchTerm.objects.filter(term__in=words)
+        terms = self.filter_documents(terms, search_cfg, query_text, author, date_start, date_end, prefix='document__')
+        score = Sum(Case(*[When(term=word, then=ExpressionWrapper(F('frequency') * Value(weight), output_field=FloatField()))
+                           for word, weight in weights.items()], output_field=FloatField()))
+        return (terms.values('document__object_id')
+                .annotate(matches=Count('term'), score=score)
+                .filter(matches=len(words))
+                .order_by('-score', '-document__date')
+                .values_list('document__object_id', 'score'))
+
+
+class PostgreSQLBackend(BaseSearchBackend):
+    """
+    Backend relying on PostgreSQL full text search. Objects are ranked by ts_rank.
+    The GIN index on to_tsvector(config, text) is created by commons migrations.
+    """
+    config = 'french'  # Must match the index created by commons migrations
+
+    def search(self, search_cfg, query_text, author='', date_start=None, date_end=None):
+        if len(self.get_terms(query_text)) == 0:
+            return SearchDocument.objects.none().values_list('object_id', 'pk')
+
+        vector = "to_tsvector('{}', {}.text)".format(self.config, SearchDocument._meta.db_table)
+        query = "plainto_tsquery('{}', %s)".format(self.config)
+        # Stemming is handled by PostgreSQL
+        words = ' '.join(normalize_query(query_text))
+
+        documents = SearchDocument.objects.extra(where=['{} @@ {}'.format(vector, query)], params=[words])
+        documents = self.filter_documents(documents, search_cfg, query_text, author, date_start, date_end)
+        return (documents.annotate(score=RawSQL('ts_rank({}, {})'.format(vector, query), (words,)))
+                .order_by('-score', '-date')
+                .values_list('object_id', 'score'))
@@ -0,0 +1,32 @@
+from django.db.models.signals import post_save, post_delete
+
+from helpers.decorators import signal_ignore_fixture
+
+from .search import SEARCH
+from .search_backends import get_backend
+
+
+def get_search_configs(instance):
+    """
+    Return the entries of SEARCH that target the model of given instance.
+    """
+    model = instance._meta.concrete_model
+    return [cfg for cfg in SEARCH if cfg['manager'].model._meta.concrete_model == model]
+
+
+@signal_ignore_fixture
+def update_search_index(sender, instance, **kwargs):
+    for search_cfg in get_search_configs(instance):
+        get_backend().index(search_cfg, instance)
+
+
+@signal_ignore_fixture
+def remove_from_search_index(sender, instance, **kwargs):
+    for search_cfg in get_search_configs(instance):
+        get_backend().remove(search_cfg, instance)
+
+
+for search_cfg in SEARCH:
+    model = search_cfg['manager'].model._meta.concrete_model
+    post_save.connect(update_search_index, sender=model, dispatch_uid='search-index-save-%s' % model._meta.label)
+    post_delete.connect(remove_from_search_index, sender=model, dispatch_uid='search-index-delete-%s' % model._meta.label)
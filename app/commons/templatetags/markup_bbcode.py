@@ -1,8 +1,10 @@
 from django import template
+from django.core.cache import cache
 from django.utils.safestring import mark_safe
 from html.entities import codepoint2name
 from django.conf import settings
 
+import hashlib
 import re
 import os
 
@@ -10,52 +12,53 @@ register = template.Library()
 
 BASE_URL_RE = r'(?:ftp)|(?:https?)://[^\s\(\)\[\]]{3,}?'
 
-# tagname : (regex, html, clean)
+# tagname : (regex, html, clean, guard)
+# guard lists strings of which at least one must appear in the text for regex to match.
 tag = [
     # b
-    (r'\[b\](.*?)\[/b\]', r'<b>\1</b>', r'\1'),
+    (r'\[b\](.*?)\[/b\]', r'<b>\1</b>', r'\1', ('[b]',)),
     # u
-    (r'\[u\](.*?)\[/u\]', r'<u>\1</u>', r'\1'),
+    (r'\[u\](.*?)\[/u\]', r'<u>\1</u>', r'\1', ('[u]',)),
     # i
-    (r'\[i\](.*?)\[/i\]', r'<em>\1</em>', r'\1'),
+    (r'\[i\](.*?)\[/i\]', r'<em>\1</em>', r'\1', ('[i]',)),
     # strike
-    (r'\[strike\](.*?)\[/strike\]', r'<strike>\1</strike>', r'\1'),
+    (r'\[strike\](.*?)\[/strike\]', r'<strike>\1</strike>', r'\1', ('[strike]',)),
 
     # color=
-    (r'\[color=(.*?)\](.*?)\[/color\]', r'<span style="color:\1;">\2</span>', r'\2'),
+    (r'\[color=(.*?)\](.*?)\[/color\]', r'<span style="color:\1;">\2</span>', r'\2', ('[color=',)),
     # font=
-    (r'\[font=(.*?)\](.*?)\[/font\]', r'<span style="font-family:\1;">\2</span>', r'\2'),
+    (r'\[font=(.*?)\](.*?)\[/font\]', r'<span style="font-family:\1;">\2</span>', r'\2', ('[font=',)),
     # size=
-    (r'\[size=(.*?)\](.*?)\[/size\]', r'<span style="font-size:\1;">\2</span>', r'\2'),
+    (r'\[size=(.*?)\](.*?)\[/size\]', r'<span style="font-size:\1;">\2</span>', r'\2', ('[size=',)),
     # align=
-    (r'\[align=(.*?)\](.*?)\[/align\]', r'<div align="\1">\2</div>', r'\2'),
+    (r'\[align=(.*?)\](.*?)\[/align\]', r'<div align="\1">\2</div>', r'\2', ('[align=',)),
 
     # url
-    (r'(^|\s|\(|\[)('+BASE_URL_RE+')($|\s|\)|\])', r'\1<a href="\2">\2</a>\3', r'\1\2\3'),
-    (r'\[url\]('+BASE_URL_RE+')\[/url\]', r'<a href="\1">\1</a>', r'\1'),
-    (r'\[url=('+BASE_URL_RE+')\](.*?)\[/url\]', r'<a href="\1">\2</a>', r'\2'),
+    (r'(^|\s|\(|\[)('+BASE_URL_RE+')($|\s|\)|\])', r'\1<a href="\2">\2</a>\3', r'\1\2\3', ('ftp', 'http')),
+    (r'\[url\]('+BASE_URL_RE+')\[/url\]', r'<a href="\1">\1</a>', r'\1', ('[url]',)),
+    (r'\[url=('+BASE_URL_RE+')\](.*?)\[/url\]', r'<a href="\1">\2</a>', r'\2', ('[url=',)),
 
     # img
-    (r'\[img\]('+BASE_URL_RE+')\[/img\]', r'<img src="\1"/>', r'\1'),
+    (r'\[img\]('+BASE_URL_RE+')\[/img\]', r'<img src="\1"/>', r'\1', ('[img]',)),
 
     # embed
-    (r'\[embed\]('+BASE_URL_RE+')\[/embed\]', r'<a class="oembed" href="\1">\1</a>', r'\1'),
+    (r'\[embed\]('+BASE_URL_RE+')\[/embed\]', r'<a class="oembed" href="\1">\1</a>', r'\1', ('[embed]',)),
 
     # spoiler
-    (r'\[spoiler\](.*?)\[/spoiler\]', '<span class="spoiler" onclick="$(this).toggleClass(\'spoiler-show\');"><span>\\1</span></span>', r'\1'),
+    (r'\[spoiler\](.*?)\[/spoiler\]', '<span class="spoiler" onclick="$(this).toggleClass(\'spoiler-show\');"><span>\\1</span></span>', r'\1', ('[spoiler]',)),
 ]
 
 advancedtag = [
     # code
-    (r'\[code\]([^\n]*?)\[/code\]', r'<code>\1</code>', r'\1'),
-    (r'(?:\n)*\[code\](?:\n)?(.*?)(?:\n)?\[/code\](?:\n)*', r'<pre><code>\1</code></pre>', r'\1'),
+    (r'\[code\]([^\n]*?)\[/code\]', r'<code>\1</code>', r'\1', ('[code]',)),
+    (r'(?:\n)*\[code\](?:\n)?(.*?)(?:\n)?\[/code\](?:\n)*', r'<pre><code>\1</code></pre>', r'\1', ('[code]',)),
 
     # quote
-    (r'(?:\n)*\[quote\](?:\n)?(.*?)(?:\n)?\[/quote\](?:\n)*', r'<blockquote>\1</blockquote>', r' \1 '),
-    (r'(?:\n)*\[quote=(.*?)\](?:\n)?(.*?)(?:\n)?\[/quote\](?:\n)*', r'<blockquote><cite>\1</cite>\2</blockquote>', r' \1: \2 '),
+    (r'(?:\n)*\[quote\](?:\n)?(.*?)(?:\n)?\[/quote\](?:\n)*', r'<blockquote>\1</blockquote>', r' \1 ', ('[quote]',)),
+    (r'(?:\n)*\[quote=(.*?)\](?:\n)?(.*?)(?:\n)?\[/quote\](?:\n)*', r'<blockquote><cite>\1</cite>\2</blockquote>', r' \1: \2 ', ('[quote=',)),
  
     # sign=
-    (r'\[sign=(.*?)\](.*?)\[/sign\]', r'<div class="sign sign-base"><div class="text">\2</div><div class="smiley">\1</div></div>', r'\2'),
+    (r'\[sign=(.*?)\](.*?)\[/sign\]', r'<div class="sign sign-base"><div class="text">\2</div><div class="smiley">\1</div></div>', r'\2', ('[sign=',)),
 ]
 
 smiley_list = [
@@ -86,43 +89,105 @@ def prepare_regex():
 
     # Prepare regex
     if _simple_tags is None:
-        _simple_tags = [(re.compile(x, re.MULTILINE|re.DOTALL), y, z) for x, y, z in tag]
+        _simple_tags = [(re.compile(x, re.MULTILINE|re.DOTALL), y, z, g) for x, y, z, g in tag]
     if _advanced_tags is None:
-        _advanced_tags = [(re.compile(x, re.MULTILINE|re.DOTALL), y, z) for x, y, z in advancedtag]
+        _advanced_tags = [(re.compile(x, re.MULTILINE|re.DOTALL), y, z, g) for x, y, z, g in advancedtag]
 
     return _simple_tags, _advanced_tags
 
 
-def replace_smiley(value):
+def apply_tags(value, clean=False):
+    """
+    Convert the BBCode tags of (escaped) value to html, or remove them if clean is set.
+    A regex is only run if its guard appears in the text, and the fixpoint
+    on advanced tags stops as soon as a pass does not substitute anything.
+    """
+    simple_tags, advanced_tags = prepare_regex()
+
+    for reg, html, text, guard in simple_tags:
+        if any(x in value for x in guard):
+            value = reg.sub(text if clean else html, value)
+
+    # Advanced tags can be nested
+    for reg, html, text, guard in advanced_tags:
+        replaced = 1
+        while replaced and any(x in value for x in guard):
+            value, replaced = reg.subn(text if clean else html, value)
+
+    return value
+
+
+_smileys = None
+
+def load_smileys():
+    """
+    Return the table of smileys, as a dict with:
+     - 'special' and 'other': for the smileys of smiley_list and for the :name: smileys
+       found in the smileys directory, a regex matching them and a dict mapping them
+       to their html;
+     - 'version': a string that changes whenever the table changes.
+    The table is built once. If SMILEY_AUTORELOAD is set, it is rebuilt as soon as the
+    smileys directory is modified.
+    """
+    global _smileys
+
     # List of available smileys in smileys directory
     local_smiley_dir = os.path.join(settings.STATIC_ROOT, 'images', 'smiley')
 
     online_smiley_dir = os.path.join(settings.STATIC_URL, 'images', 'smiley')
 
+    if _smileys is not None and _smileys['directory'] == local_smiley_dir:
+        if not settings.SMILEY_AUTORELOAD:
+            return _smileys
+        try:
+            mtime = os.stat(local_smiley_dir).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if mtime == _smileys['mtime']:
+            return _smileys
+
     try:
+        mtime = os.stat(local_smiley_dir).st_mtime
         smiley_other = [(x[:-4],x[-3:]) for x in os.listdir(local_smiley_dir) if x[-3:] == 'gif']
     except FileNotFoundError:
+        mtime = None
         smiley_other = []
 
-    # Convert special smiley's
-    for s, name in smiley_list:
-        value = value.replace(s, '<img src="%s"/>' % os.path.join(online_smiley_dir, name+".gif"))
+    special = {s: '<img src="%s"/>' % os.path.join(online_smiley_dir, name+".gif") for s, name in smiley_list}
+    other = {':%s:' % name: '<img src="%s"/>' % os.path.join(online_smiley_dir, name+'.'+ext) for name, ext in smiley_other}
+
+    def alternation(smileys):
+        # Longest smileys first, so that eg. ":-((" is preferred over ":-("
+        if len(smileys) == 0:
+            return None
+        return re.compile('|'.join(re.escape(x) for x in sorted(smileys, key=len, reverse=True)))
+
+    _smileys = {
+        'directory': local_smiley_dir,
+        'mtime': mtime,
+        'special': (alternation(special), special),
+        'other': (alternation(other), other),
+        'version': hashlib.sha1(' '.join(sorted(other.values())).encode('utf-8')).hexdigest()[:8],
+    }
+    return _smileys
 
-    # Convert other smiley's
-    for name, ext in smiley_other:
-        value = value.replace(':%s:' % name, '<img src="%s"/>' % os.path.join(online_smiley_dir, name+'.'+ext))
+
+def replace_smiley(value):
+    smileys = load_smileys()
+
+    # Convert special smiley's, then other smiley's
+    for regex, html in [smileys['special'], smileys['other']]:
+        if regex is not None:
+            value = regex.sub(lambda m: html[m.group()], value)
 
     return value
 
 
+_entities = {chr(code): '&' + name + ';' for code, name in codepoint2name.items()}
+_entities_re = re.compile('[' + ''.join(re.escape(c) for c in sorted(_entities)) + ']')
+
 def htmlentities(value):
-    t = []
-    for c in value:
-        if ord(c) in codepoint2name:
-            t.append('&' + codepoint2name[ord(c)] + ';')
-        else:
-            t.append(c)
-    return ''.join(t)
+    return _entities_re.sub(lambda m: _entities[m.group()], value)
 
 
 @register.filter
@@ -130,48 +195,56 @@ def smiley(value):
     return mark_safe(replace_smiley(value))
 
 
-@register.filter
-def bbcode(value, replace_smiley=True):
+# Rendered html is cached, using a hash of the text as key.
+CACHE_TIMEOUT = 7 * 24 * 3600
+CACHE_MIN_LENGTH = 200  # Shorter texts are faster to render than to fetch from the cache
+
+def _cache_key(value, replace_smiley):
+    digest = hashlib.sha1(value.encode('utf-8')).hexdigest()
+    if replace_smiley:
+        return 'bbcode-{}-{}'.format(digest, load_smileys()['version'])
+    return 'bbcode-{}-0'.format(digest)
+
+
+def clear_cache(value):
+    """
+    Remove the rendered html of given text from the cache.
+    """
+    cache.delete_many([_cache_key(value, True), _cache_key(value, False)])
+
+
+def render_bbcode(value, replace_smiley=True):
     value = htmlentities(value)
     value = value.replace('\r\n', '\n')  # Limit spacing
 
-    simple_tags, advanced_tags = prepare_regex()
-
     # Convert BBcode to html
-    for reg, rep, _ in simple_tags:
-        value = reg.sub(rep, value)
-
-    # Convert special tags
-    for reg, rep, _ in advanced_tags:
-        temp = ''
-        while temp != value:
-            temp = value
-            value = reg.sub(rep, value)
+    value = apply_tags(value)
 
     # Smileys
     if replace_smiley:
         value = smiley(value)
 
-    value = value.replace('\n', '<br/>')
+    return value.replace('\n', '<br/>')
 
-    return mark_safe(value)
+
+@register.filter
+def bbcode(value, replace_smiley=True):
+    if len(value) < CACHE_MIN_LENGTH:
+        return mark_safe(render_bbcode(value, replace_smiley))
+
+    key = _cache_key(value, replace_smiley)
+    html = cache.get(key)
+    if html is None:
+        html = render_bbcode(value, replace_smiley)
+        cache.set(key, html, CACHE_TIMEOUT)
+    return mark_safe(html)
 
 
 @register.filter
 def stripbbcode(value):
     value = htmlentities(value)
 
-    simple_tags, advanced_tags = prepare_regex()
-
     # Convert BBcode to nothing
-    for reg, _, rep in simple_tags:
-        value = reg.sub(rep, value)
+    value = apply_tags(value, clean=True)
 
-    # Convert special tags
-    for reg, _, rep in advanced_tags:
-        temp = ''
-        while temp != value:
-            temp = value
-            value = reg.sub(rep, value)
-
-    return mark_safe(value) 
+    return mark_safe(value)
@@ -2,6 +2,7 @@ from django import template
 from django.utils.safestring import mark_safe
 
 import markdown
+import threading
 from markdown.inlinepatterns import LinkPattern
 
 register = template.Library()
@@ -24,12 +25,30 @@ class OEmbedExtension(markdown.Extension):
         md.inlinePatterns.add('embed', OEmbedExtension.OEmbedPattern('\[!embed\]\((.*)\)', md), '<link')
 
 
-@register.filter(name='markdown', is_safe=True)
-def __markdown(value):
-    extensions = ['def_list', 'fenced_code', 'footnotes', 'tables', 'nl2br',
-                  'smart_strong', 'sane_lists', OEmbedExtension()]
+_local = threading.local()
+
+def get_converter():
+    """
+    Return a Markdown converter. Converters are expensive to build but are not
+    thread-safe, so one converter is built for each thread and then reused.
+    """
+    converter = getattr(_local, 'converter', None)
+    if converter is None:
+        extensions = ['def_list', 'fenced_code', 'footnotes', 'tables', 'nl2br',
+                      'smart_strong', 'sane_lists', OEmbedExtension()]
+        converter = markdown.Markdown(safe_mode='escape', output_format='html5', lazy_ol=False, extensions=extensions)
+        _local.converter = converter
+    return converter
+
 
-    value = markdown.markdown(value, safe_mode='escape', output_format='html5', lazy_ol=False, extensions=extensions)
+def render_markdown(value):
+    """
+    Convert given Markdown text to html.
+    """
+    return get_converter().reset().convert(value)
 
-    return mark_safe(value)
+
+@register.filter(name='markdown', is_safe=True)
+def __markdown(value):
+    return mark_safe(render_markdown(value))
 
@@ -194,3 +194,17 @@ def sliced_pagination(parser, token):
     if not trash == 'as':
         raise TemplateSyntaxError(_get_errstr(fnctn))
     return _PaginatorSliceNode(context_name, paginatorname, max_items)
+
+
+@register.filter
+def page_query(page, number):
+    """
+    Return the query string that leads to given page number, ie. the cursor
+    of this page if page is a helpers.paginator.KeysetPage that knows it,
+    or an empty string otherwise.
+
+    Sample syntax:
+    <a href="{% url page_url page_n %}{{ page_obj|page_query:page_n }}">{{ page_n }}</a>
+    """
+    cursor = getattr(page, 'cursors', {}).get(number, None)
+    return '' if cursor is None else '?cursor={}'.format(cursor)
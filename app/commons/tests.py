@@ -3,10 +3,21 @@ import subprocess
 import os
 import filecmp
 import glob
+import datetime
+import importlib
+from io import StringIO
+from django.apps import apps
 from django.test import TestCase
+from django.core.management import call_command
 from django.core.urlresolvers import reverse
 from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from board.models import Thread, Message
+from profile.models import ActiveUser
+from commons.models import SearchDocument
 from .search import SEARCH
+from commons.search_backends import get_backend
 from difflib import context_diff
 
 backup_file = lambda x: '%s.orig' % x
@@ -81,6 +92,118 @@ class SearchViewsTests(TestCase):
             self.assertEqual(response.status_code, 200)
 
 
+class SearchIndexTests(TestCase):
+    fixtures = ['devel']
+
+    def setUp(self):
+        call_command('update_search_index', stdout=StringIO())
+        self.search = SEARCH[0]  # board messages
+        self.user = ActiveUser.objects.get(username='user1')
+        self.thread = Thread(title='Hello World!')
+        self.thread.save()
+        self.messages = []
+        for text in ['Une journée à Liège', 'Liège, Liège et encore Liège', 'Namur']:
+            message = Message(author=self.user, thread=self.thread, text=text)
+            message.save()
+            self.messages.append(message)
+
+    def results(self, query_text, **kwargs):
+        return [object_id for object_id, score in get_backend().search(self.search, query_text, **kwargs)]
+
+    def test_index_all(self):
+        for search_cfg in SEARCH:
+            objects = search_cfg['manager'].model._base_manager.all()
+            documents = SearchDocument.objects.filter(content_type=get_backend().get_content_type(search_cfg))
+            self.assertEqual(documents.count(), objects.count(), search_cfg['title'])
+
+    def test_migration(self):
+        migration = importlib.import_module('commons.migrations.0002_build_search_index')
+        SearchDocument.objects.filter(pk__in=SearchDocument.objects.order_by('pk')[:5].values_list('pk', flat=True)).delete()
+        SearchDocument.objects.filter(content_type=get_backend().get_content_type(self.search)).delete()
+        migration.build_search_index(apps, None)
+        self.test_index_all()
+        self.assertListEqual(self.results('liege'), [self.messages[1].pk, self.messages[0].pk])
+
+    def test_ranking(self):
+        self.assertListEqual(self.results('liege'), [self.messages[1].pk, self.messages[0].pk])
+        self.assertListEqual(self.results('LIÈGE journée'), [self.messages[0].pk])
+        self.assertListEqual(self.results('"encore Liège"'), [self.messages[1].pk])
+        self.assertListEqual(self.results('"Liège encore"'), [])
+        self.assertListEqual(self.results('liege bruxelles'), [])
+
+    def test_filters(self):
+        self.assertListEqual(self.results('namur', author='user'), [self.messages[2].pk])
+        self.assertListEqual(self.results('namur', author='admin'), [])
+        date = self.messages[2].date
+        self.assertListEqual(self.results('namur', date_end=date - datetime.timedelta(1)), [])
+
+    def test_update(self):
+        message = self.messages[2]
+        message.text = 'Mons'
+        message.save()
+        self.assertListEqual(self.results('namur'), [])
+        self.assertListEqual(self.results('mons'), [message.pk])
+
+        message.delete()
+        self.assertListEqual(self.results('mons'), [])
+
+    def test_manager_filter(self):
+        self.search = SEARCH[5]  # active users
+        self.assertListEqual(self.results('user1'), [self.user.pk])
+        self.user.is_active = False
+        self.user.save()
+        self.assertListEqual(self.results('user1'), [])
+
+    def test_view_pagination(self):
+        for i in range(25):
+            Message(author=self.user, thread=self.thread, text='Dinant %d' % i).save()
+        fields = {'query_text': 'dinant',
+                  'target': 0,
+                  'author': '',
+                  'date_start': '',
+                  'date_end': ''}
+        response = self.client.get(reverse('search'), fields)
+        self.assertEqual(response.context['page_obj'].paginator.count, 25)
+        self.assertEqual(len(response.context['result_list']), 20)
+
+        fields['page'] = 2
+        response = self.client.get(reverse('search'), fields)
+        self.assertEqual(len(response.context['result_list']), 5)
+
+
+    def test_view_queries(self):
+        fields = {'query_text': 'dinant',
+                  'target': 0,
+                  'author': '',
+                  'date_start': '',
+                  'date_end': ''}
+        Message(author=self.user, thread=self.thread, text='Dinant').save()
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('search'), fields)
+        for i in range(10):
+            Message(author=self.user, thread=Thread.objects.create(title='Dinant'), text='Dinant %d' % i).save()
+        with self.assertNumQueries(len(context)):
+            self.client.get(reverse('search'), fields)
+
+    def test_view_max_results(self):
+        for i in range(25):
+            Message(author=self.user, thread=self.thread, text='Dinant %d' % i).save()
+        fields = {'query_text': 'dinant',
+                  'target': 0,
+                  'author': '',
+                  'date_start': '',
+                  'date_end': ''}
+        with self.settings(SEARCH_MAX_RESULTS=10):
+            results = []
+            for start in [0, 10, 20]:
+                fields['start'] = start
+                response = self.client.get(reverse('search'), fields)
+                self.assertEqual(response.context['page_obj'].paginator.count, min(10, 25 - start))
+                self.assertEqual('next_query_string' in response.context, start < 20)
+                results.extend(response.context['result_list'])
+        self.assertEqual(len(set(results)), 25)
+
+
 @unittest.skipIf(not settings.RUN_NPM_TESTS, 'Grunt tests are disabled')
 class StaticFileTests(TestCase):
     nunjucks_templates = 'app/commons/static/js/nunjucks.templates.js'
@@ -0,0 +1,176 @@
+import os
+import random
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils.safestring import mark_safe
+
+from helpers.benchmark import LexpageBenchmarkTestCase
+from commons.templatetags import markup_bbcode
+from commons.templatetags.markup_bbcode import bbcode, stripbbcode, tag, advancedtag, smiley_list
+from html.entities import codepoint2name
+
+
+_legacy_tags = [(re.compile(x, re.MULTILINE | re.DOTALL), y, z) for x, y, z, g in tag]
+_legacy_advanced_tags = [(re.compile(x, re.MULTILINE | re.DOTALL), y, z) for x, y, z, g in advancedtag]
+
+
+def legacy_htmlentities(value):
+    t = []
+    for c in value:
+        if ord(c) in codepoint2name:
+            t.append('&' + codepoint2name[ord(c)] + ';')
+        else:
+            t.append(c)
+    return ''.join(t)
+
+
+def legacy_replace_smiley(value):
+    local_smiley_dir = os.path.join(settings.STATIC_ROOT, 'images', 'smiley')
+    online_smiley_dir = os.path.join(settings.STATIC_URL, 'images', 'smiley')
+
+    try:
+        smiley_other = [(x[:-4], x[-3:]) for x in os.listdir(local_smiley_dir) if x[-3:] == 'gif']
+    except FileNotFoundError:
+        smiley_other = []
+
+    for s, name in smiley_list:
+        value = value.replace(s, '<img src="%s"/>' % os.path.join(online_smiley_dir, name + ".gif"))
+    for name, ext in smiley_other:
+        value = value.replace(':%s:' % name, '<img src="%s"/>' % os.path.join(online_smiley_dir, name + '.' + ext))
+    return value
+
+
+def legacy_bbcode(value, replace_smiley=True, clean=False):
+    """
+    The bbcode (and stripbbcode, if clean is set) filter, as it was implemented
+    before the regex guards and the cache were introduced. Kept as a reference.
+    """
+    value = legacy_htmlentities(value)
+    if not clean:
+        value = value.replace('\r\n', '\n')
+
+    for reg, html, text in _legacy_tags:
+        value = reg.sub(text if clean else html, value)
+
+    for reg, html, text in _legacy_advanced_tags:
+        temp = ''
+        while temp != value:
+            temp = value
+            value = reg.sub(text if clean else html, value)
+
+    if clean:
+        return mark_safe(value)
+    if replace_smiley:
+        value = legacy_replace_smiley(value)
+    return mark_safe(value.replace('\n', '<br/>'))
+
+
+FRAGMENTS = [
+    'Salut tout le monde !',
+    "Je suis d'accord avec toi, c'est à peu près ça.",
+    'Ça dépend de la météo à Liège, évidemment.',
+    '1 < 2 && 3 > 2, "non ?"',
+    '[b]important[/b]',
+    '[i]bof[/i] et [u]souligné[/u]',
+    '[strike]barré[/strike]',
+    '[color=red]rouge[/color]',
+    '[size=20px][font=Arial]gros[/font][/size]',
+    '[align=center]centré[/align]',
+    'Voir http://www.lexpage.net/board/ pour les détails',
+    '(https://example.com/page?x=1&y=2)',
+    '[url]http://example.com[/url]',
+    '[url=http://example.com/a]un lien[/url]',
+    '[img]http://example.com/image.png[/img]',
+    '[embed]https://www.youtube.com/watch?v=dQw4w9WgXcQ[/embed]',
+    '[spoiler]il meurt à la fin[/spoiler]',
+    '[code]x = y[/code]',
+    '[code]\r\ndef f(x):\r\n    return [x][/code]',
+    '[quote]Une citation[/quote]',
+    '[quote=Lexpagien]\r\n[quote=Autre]Citation imbriquée[/quote]\r\nRéponse[/quote]',
+    '[sign=:-)]Panneau[/sign]',
+    ':-) ;-) :-D o.O :-(( 8-)',
+    ':angel: :-p :bat::clown: :cool:-) :nonexistent:',
+    '[b]non fermé',
+    '[/i] fermé sans ouverture',
+    'ftp est un protocole',
+    '<script>alert("hello");</script>',
+]
+
+
+def make_corpus(size, seed=0):
+    """
+    Return a list of size random posts, made of FRAGMENTS.
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(size):
+        lines = [' '.join(rng.choice(FRAGMENTS) for j in range(rng.randint(1, 6))) for k in range(rng.randint(1, 8))]
+        corpus.append('\r\n'.join(lines))
+    return corpus
+
+
+# Use the smileys of commons, as STATIC_ROOT is not populated in tests
+SMILEY_SETTINGS = {'STATIC_ROOT': os.path.join(settings.BASE_DIR, 'commons', 'static')}
+
+
+@override_settings(**SMILEY_SETTINGS)
+class BBCodeEquivalenceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_bbcode(self):
+        for text in make_corpus(300):
+            self.assertEqual(bbcode(text), legacy_bbcode(text), text)
+            self.assertEqual(bbcode(text, False), legacy_bbcode(text, False), text)
+
+    def test_bbcode_cached(self):
+        for text in make_corpus(50):
+            bbcode(text)
+            self.assertEqual(bbcode(text), legacy_bbcode(text), text)
+
+    def test_stripbbcode(self):
+        for text in make_corpus(300):
+            self.assertEqual(stripbbcode(text), legacy_bbcode(text, clean=True), text)
+
+    def test_smiley(self):
+        for text in make_corpus(300):
+            self.assertEqual(markup_bbcode.smiley(text), legacy_replace_smiley(text), text)
+        self.assertIn('angel.gif', markup_bbcode.smiley(':angel:'))
+
+
+@override_settings(**SMILEY_SETTINGS)
+class BBCodeBenchmark(LexpageBenchmarkTestCase):
+    def setUp(self):
+        # Small enough to fit in the local memory cache used in dev
+        self.corpus = make_corpus(250)
+
+    def test_bbcode(self):
+        def render(function):
+            return lambda: [function(text) for text in self.corpus]
+
+        legacy = self.timeit(render(legacy_bbcode))
+        cache.clear()
+        uncached = self.timeit(render(markup_bbcode.render_bbcode))
+        bbcode(self.corpus[0])
+        cached = self.timeit(render(bbcode))
+
+        with self.report('BBCode, {} posts'.format(len(self.corpus))) as lines:
+            lines.append('legacy:   {:.2f}ms'.format(legacy * 1000))
+            lines.append('uncached: {:.2f}ms'.format(uncached * 1000))
+            lines.append('cached:   {:.2f}ms'.format(cached * 1000))
+        self.assertLess(uncached, legacy)
+
+    def test_smiley(self):
+        def render(function):
+            return lambda: [function(text) for text in self.corpus]
+
+        legacy = self.timeit(render(legacy_replace_smiley))
+        current = self.timeit(render(markup_bbcode.replace_smiley))
+
+        with self.report('Smileys, {} posts'.format(len(self.corpus))) as lines:
+            lines.append('legacy:  {:.3f}ms per post'.format(legacy * 1000 / len(self.corpus)))
+            lines.append('current: {:.3f}ms per post'.format(current * 1000 / len(self.corpus)))
+        self.assertLess(current, legacy)
@@ -1,50 +1,93 @@
-from commons import search
+from django.conf import settings
+from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.shortcuts import render
 from django.views.generic import View
 from commons.forms_search import SearchForm
+from commons.search_backends import get_backend
 
 import commons.search as search
 
 
+RESULTS_PER_PAGE = 20
+
+
 class SearchView(View):
     def post(self, request, *args, **kwargs):
         self.form = SearchForm(request.POST)
-
-        if self.form.is_valid():
-            # Compute the query and store it
-            query = self.form.cleaned_data['query_text']
-            target = self.form.cleaned_data['target']
-            author = self.form.cleaned_data['author']
-            date_start = self.form.cleaned_data['date_start']
-            date_end = self.form.cleaned_data['date_end']
-
-            self.search = search.SEARCH[target]
-
-            self.query = search.get_query_for_fields(self.search, query)
-            self.query &= search.get_query_for_author(self.search, author)
-            self.query &= search.get_query_for_date(self.search, date_start, date_end)
-
         return self.render(request)
 
     def get(self, request, *args, **kwargs):
-        self.form = SearchForm()
+        # Results are paginated, so queries are also accepted in GET
+        self.form = SearchForm(request.GET) if 'query_text' in request.GET else SearchForm()
         return self.render(request)
 
+    def get_start(self):
+        """
+        Return the rank of the first result of the current batch of results.
+        """
+        try:
+            return max(0, int(self.request.GET.get('start', 0)))
+        except ValueError:
+            return 0
+
+    def get_results(self, start):
+        """
+        Return a paginator over the (object_id, score) pairs of the objects that match
+        the (valid) form, ordered by decreasing relevance, starting at given rank.
+        At most SEARCH_MAX_RESULTS results are retrieved, and a boolean is returned
+        alongside the paginator to tell if more results exist.
+        """
+        data = self.form.cleaned_data
+        results = get_backend().search(self.search, data['query_text'], data['author'],
+                                       data['date_start'], data['date_end'])
+        results = list(results[start:start + settings.SEARCH_MAX_RESULTS + 1])
+        more = len(results) > settings.SEARCH_MAX_RESULTS
+        return Paginator(results[:settings.SEARCH_MAX_RESULTS], RESULTS_PER_PAGE), more
+
+    def get_page(self, paginator):
+        try:
+            return paginator.page(self.request.GET.get('page', 1))
+        except PageNotAnInteger:
+            return paginator.page(1)
+        except EmptyPage:
+            return paginator.page(paginator.num_pages)
+
     def render(self, request):
         context = {'form': self.form}
 
-        if hasattr(self, 'query'):
-            # We have a query, compute the queryset
-            results = self.search['manager'].all().filter(self.query).order_by('-' + self.search['date_field'])
+        if self.form.is_bound and self.form.is_valid():
+            self.search = search.SEARCH[self.form.cleaned_data['target']]
+            start = self.get_start()
+            paginator, more = self.get_results(start)
+            page = self.get_page(paginator)
+
+            # Only the objects of the current page are loaded
+            object_ids = [object_id for object_id, score in page.object_list]
+            objects = self.search['manager'].all().select_related(*self.search['select_related']).in_bulk(object_ids)
+
             result_list = []
-            for result in results:
+            for object_id in object_ids:
+                if object_id not in objects:
+                    continue
+                result = objects[object_id]
                 setattr(result, 'search_title', self.search['display_title'](result))
                 setattr(result, 'search_summary', self.search['display_summary'](result))
 
                 setattr(result, 'search_author', self.search['display_author'](result))
                 setattr(result, 'search_date', self.search['display_date'](result))
                 result_list.append(result)
+
+            query = self.form.data.copy()
+            for key in ['page', 'start', 'csrfmiddlewaretoken']:
+                query.pop(key, None)
+
             context['result_title'] = self.search['title']
             context['result_list'] = result_list
+            context['page_obj'] = page
+            context['result_start'] = start
+            context['query_string'] = query.urlencode() + '&start={}'.format(start)
+            context['previous_query_string'] = query.urlencode() + '&start={}'.format(max(0, start - settings.SEARCH_MAX_RESULTS))
+            if more:
+                context['next_query_string'] = query.urlencode() + '&start={}'.format(start + settings.SEARCH_MAX_RESULTS)
 
         return render(self.request, 'commons/search.html', context)
@@ -0,0 +1,41 @@
+from contextlib import contextmanager
+from unittest import skipIf
+import time
+
+from django.conf import settings
+from django.test import TestCase
+
+__all__ = ['LexpageBenchmarkTestCase']
+
+
+@skipIf(not getattr(settings, 'RUN_BENCHMARKS', False), 'Benchmarks are disabled')
+class LexpageBenchmarkTestCase(TestCase):
+    """
+    Base class for (slow) benchmarks. They are run only if RUN_BENCHMARKS is set.
+    """
+    repeat = 5
+
+    def timeit(self, func, repeat=None):
+        """
+        Return the best time (in seconds) of several calls to func.
+        :param func: a callable with no argument
+        :param repeat: number of calls, defaults to self.repeat
+        :return: best time, in seconds
+        """
+        timings = []
+        for i in range(repeat or self.repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    @contextmanager
+    def report(self, title):
+        """
+        Print given title followed by the lines that are appended to the yielded list.
+        """
+        lines = []
+        yield lines
+        print('\n' + title)
+        for line in lines:
+            print('  ' + line)
@@ -0,0 +1,127 @@
+from django.core.paginator import Paginator, Page, EmptyPage
+
+
+class KeysetPage(Page):
+    """
+    A page that knows the cursors of its neighbouring pages.
+    """
+    def __init__(self, object_list, number, paginator):
+        super().__init__(list(object_list), number, paginator)
+        self._cursors = None
+
+    @property
+    def cursors(self):
+        """
+        Return a dict that maps the numbers of the neighbouring pages to a cursor, ie. the pk
+        of their first object. Cursors are computed with two index scans of at most
+        KeysetPaginator.window pages, whatever the depth of the current page.
+        """
+        if self._cursors is None:
+            self._cursors = self.paginator.get_cursors(self)
+        return self._cursors
+
+
+class KeysetPaginator(Paginator):
+    """
+    A paginator that fetches a page by seeking on (key, pk) instead of using an
+    OFFSET, as soon as the pk of the first object of the requested page (the cursor)
+    is known. Such cursors are provided by KeysetPage.cursors for the neighbouring
+    pages (see page_query template filter). Without cursor, the page is fetched
+    from the closest end of the list.
+
+    :param key: name of the field the object list is ordered by (ties are broken by pk)
+    :param cursor: pk of the first object of the page that will be requested, if known
+    :param count: number of objects, if known (avoids a COUNT query)
+    """
+    window = 4  # Number of neighbouring pages (on each side) for which a cursor is provided
+
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True,
+                 key='date', cursor=None, count=None):
+        super().__init__(object_list.order_by(key, 'pk'), per_page, orphans, allow_empty_first_page)
+        self.key = key
+        try:
+            self.cursor = int(cursor) if cursor is not None else None
+        except (TypeError, ValueError):
+            self.cursor = None
+        if count is not None:
+            self._count = count
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        if top + self.orphans >= self.count:
+            top = self.count
+        object_list = list(self.fetch(bottom, top))
+        if len(object_list) == 0 and (number > 1 or not self.allow_empty_first_page):
+            # The given count was outdated
+            raise EmptyPage('That page contains no results')
+        return self._get_page(object_list, number, self)
+
+    def _get_page(self, *args, **kwargs):
+        return KeysetPage(*args, **kwargs)
+
+    def seek(self, pk, forward=True, inclusive=True):
+        """
+        Return the objects that come after (or before) the object identified by pk,
+        ordered accordingly, or None if this object does not exist anymore.
+        """
+        try:
+            value = self.object_list.values_list(self.key, flat=True).get(pk=pk)
+        except self.object_list.model.DoesNotExist:
+            return None
+
+        if forward:
+            pk_lookup = 'lt' if inclusive else 'lte'
+            queryset = self.object_list.filter(**{self.key + '__gte': value})
+            return queryset.exclude(**{self.key: value, 'pk__' + pk_lookup: pk})
+        else:
+            pk_lookup = 'gt' if inclusive else 'gte'
+            queryset = self.object_list.filter(**{self.key + '__lte': value})
+            return queryset.exclude(**{self.key: value, 'pk__' + pk_lookup: pk}).reverse()
+
+    def fetch(self, bottom, top):
+        """
+        Return the objects between positions bottom and top.
+        """
+        if self.cursor is not None:
+            queryset = self.seek(self.cursor)
+            if queryset is not None:
+                return queryset[:top - bottom]
+
+        if bottom > self.count - top:
+            # Closer to the end of the list
+            return reversed(self.object_list.reverse()[self.count - top:self.count - bottom])
+        return self.object_list[bottom:top]
+
+    def get_cursors(self, page):
+        if len(page.object_list) == 0:
+            return {}
+
+        cursors = {}
+        size = self.window * self.per_page
+
+        before = list(self.seek(page.object_list[0].pk, forward=False, inclusive=False).values_list('pk', flat=True)[:size])
+        for i in range(1, self.window + 1):
+            if len(before) >= i * self.per_page:
+                cursors[page.number - i] = before[i * self.per_page - 1]
+
+        after = list(self.seek(page.object_list[-1].pk, inclusive=False).values_list('pk', flat=True)[:size])
+        for i in range(1, self.window + 1):
+            if len(after) > (i - 1) * self.per_page and page.number + i <= self.num_pages:
+                cursors[page.number + i] = after[(i - 1) * self.per_page]
+
+        return cursors
+
+
+class SequencePaginator(KeysetPaginator):
+    """
+    A KeysetPaginator for a key that holds the 0-indexed position of each object in
+    the list (eg. board.Message.sequence). Any page is fetched with a single range
+    query on this key, so no cursor is needed.
+    """
+    def fetch(self, bottom, top):
+        return self.object_list.filter(**{self.key + '__gte': bottom, self.key + '__lt': top})
+
+    def get_cursors(self, page):
+        return {}
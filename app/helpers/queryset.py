@@ -0,0 +1,10 @@
+def raw_delete(queryset):
+    """
+    Delete the objects of given queryset with a single DELETE statement. Unlike
+    QuerySet.delete(), the objects are not loaded, the pre_delete and post_delete
+    signals are not sent, and the objects that reference them are not deleted: callers
+    must have deleted these objects and done the work of the signal handlers.
+    This relies on QuerySet._raw_delete (Django 1.9), which is not a public API.
+    :return: the number of deleted objects
+    """
+    return queryset._raw_delete(queryset.db)
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.8 on 2026-10-18 15:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def compute_thread_number(apps, schema_editor):
+    Thread = apps.get_model('messaging', 'Thread')
+    Message = apps.get_model('messaging', 'Message')
+
+    numbers = Message.objects.order_by().values('thread').annotate(number=models.Count('pk'))
+    for entry in numbers:
+        Thread.objects.filter(pk=entry['thread']).update(number=entry['number'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0002_auto_20151222_1053'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thread',
+            name='number',
+            field=models.IntegerField(default=0, verbose_name='Nombre de messages'),
+        ),
+        migrations.RunPython(compute_thread_number, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Prefetch
 from django.contrib.auth.models import User
 from django.utils.timezone import now
 
@@ -27,23 +28,18 @@ class ThreadManager(models.Manager):
         thread = Thread(title=title)
         thread.save()   # Needed to have a PK value
 
-        # Create user's message box
-        userMBox = MessageBox(user=user, thread=thread)
-        userMBox.save()
-
-        # Create MessageBoxes for targets
-        for target in targets:
-            targetMBox = MessageBox(user=target, thread=thread)
-            targetMBox.save()
+        # Create MessageBoxes for user and targets
+        MessageBox.objects.bulk_create([MessageBox(user=x, thread=thread) for x in [user] + list(targets)])
 
         # Post message
         thread.post_message(user, text)
-        return userMBox
+        return MessageBox.objects.get(user=user, thread=thread)
 
 
 class Thread(models.Model):
     title = models.CharField(verbose_name='Titre', max_length=60)
     last_message = models.ForeignKey('Message', verbose_name='Dernier message', related_name='+', db_constraint=False, default=-1)
+    number = models.IntegerField(verbose_name='Nombre de messages', default=0)
 
     objects = ThreadManager()
 
@@ -57,49 +53,42 @@ class Thread(models.Model):
 
     @property
     def recipients(self):
-        boxes = MessageBox.objects.all().filter(thread=self)
-        users = []
-        for box in boxes:
-            users.append(box.user)
+        """
+        Return the participants of the thread, ordered by username. The message boxes
+        returned by MessageBox.unarchived and MessageBox.archived come with the
+        participants of their thread, so this does not hit the database anymore.
+        """
+        boxes = getattr(self, 'participant_boxes', None)
+        if boxes is None:
+            boxes = MessageBox.objects.filter(thread=self).select_related('user__profile')
+        users = [box.user for box in boxes]
         users.sort(key=lambda x: x.username)
         return users
 
-    @property
-    def number(self):
-        return Message.objects.all().filter(thread=self).count()
-
     def post_message(self, user, text):
         """
         Post a message in the current thread and update the MessageBox instances of the participants.
+        The number of queries does not depend on the number of participants.
         :param user: author of the new message
         :param text: text of the new message
-        :return: user's MessageBox instance
+        :return: None
         """
-        """ Post a message in the current thread and update
-        the MessageBoxes according to their status. 
-        Return user's MessageBox. """
-        # Create message
-        message = Message(author=user, thread=self, text=text)
-        message.save()
-
-        self.last_message = message
-        self.save()
+        with transaction.atomic():
+            # Create message
+            message = Message(author=user, thread=self, text=text)
+            message.save()
 
-        # Update MessageBoxes
-        message_boxes = MessageBox.objects.filter(thread=self)
-        for message_box in message_boxes:
-            if message_box.status == MessageBox.STATUS_DELETED:
-                message_box.mark_normal()
-            elif message_box.status == MessageBox.STATUS_ARCHIVED:
-                message_box.mark_normal()
-            message_box.save()
+            # Message count is updated in the database, to not miss concurrent messages
+            Thread.objects.filter(pk=self.pk).update(last_message=message, number=F('number') + 1)
+            self.last_message = message
+            self.number += 1
 
-        # Update current user MessageBox's date_read
-        message_box = MessageBox.objects.get(user=user, thread=self)
-        message_box.mark_read()
-        message_box.save()
+            # Deleted and archived MessageBoxes are back in the inbox
+            MessageBox.objects.filter(thread=self).exclude(status=MessageBox.STATUS_NORMAL)\
+                .update(status=MessageBox.STATUS_NORMAL)
 
-        return message_box
+            # Author has read the thread
+            MessageBox.objects.filter(thread=self, user=user).update(date_read=now())
 
 
 class Message(models.Model):
@@ -123,7 +112,17 @@ class MessageBoxManager(models.Manager):
         self._status = status
 
     def get_queryset(self):
-        return super(MessageBoxManager, self).get_queryset().filter(status=self._status)
+        """
+        Fetch the thread, its last message and its participants with every box, as
+        they are needed to display a list of threads.
+        """
+        participants = Prefetch('thread__messagebox_set',
+                                queryset=MessageBox.objects.select_related('user__profile'),
+                                to_attr='participant_boxes')
+        return (super(MessageBoxManager, self).get_queryset()
+                .filter(status=self._status)
+                .select_related('thread__last_message__author')
+                .prefetch_related(participants))
 
 
 class MessageBox(models.Model):
@@ -1,7 +1,10 @@
 from django.core.urlresolvers import reverse
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from messaging.models import Thread, Message, MessageBox
 from profile.models import ActiveUser
+from django.contrib.auth.models import User
 
 
 class PostsTests(TestCase):
@@ -63,3 +66,93 @@ class PostsTests(TestCase):
             url = reverse('messaging_mark_'+mark, kwargs={'thread': self.thread.pk})
             response = self.client.get(url, follow=True)
             self.assertEqual(response.status_code, 200)
+
+
+class ThreadListQueriesTests(TestCase):
+    """
+    The number of queries needed to display a message box should not depend on
+    the number of threads, nor on their participants.
+    """
+    fixtures = ['devel']
+
+    def setUp(self):
+        self.user = ActiveUser.objects.get(username='user1')
+        self.client.login(username='user1', password='user1')
+
+    def create_threads(self, number):
+        targets = list(ActiveUser.objects.exclude(pk=self.user.pk))
+        for i in range(number):
+            box = Thread.objects.create_thread(self.user, 'Hello World %d!' % i, 'Hello World!', targets)
+            box.thread.post_message(targets[0], 'Hello user1!')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def test_inbox(self):
+        self.create_threads(2)
+        expected = self.count_queries(reverse('messaging_inbox'))
+        self.create_threads(5)
+        self.assertEqual(self.count_queries(reverse('messaging_inbox')), expected)
+
+    def test_archived(self):
+        self.create_threads(2)
+        for box in MessageBox.objects.filter(user=self.user):
+            box.mark_archived()
+        expected = self.count_queries(reverse('messaging_archived'))
+        self.create_threads(5)
+        for box in MessageBox.objects.filter(user=self.user):
+            box.mark_archived()
+        self.assertEqual(self.count_queries(reverse('messaging_archived')), expected)
+
+    def test_number(self):
+        box = Thread.objects.create_thread(self.user, 'Hello', 'Hello World!', ActiveUser.objects.filter(username='admin'))
+        self.assertEqual(box.thread.number, 1)
+        box.thread.post_message(self.user, 'Hello again!')
+        thread = Thread.objects.get(pk=box.thread.pk)
+        self.assertEqual(thread.number, 2)
+        self.assertEqual(thread.number, Message.objects.filter(thread=thread).count())
+        self.assertEqual(thread.last_message.text, 'Hello again!')
+
+    def test_recipients(self):
+        box = Thread.objects.create_thread(self.user, 'Hello', 'Hello World!', ActiveUser.objects.filter(username='admin'))
+        box = MessageBox.unarchived.get(pk=box.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual([user.username for user in box.thread.recipients], ['admin', 'user1'])
+            self.assertTrue(box.is_read)
+
+
+class PostMessageTests(TestCase):
+    fixtures = ['devel']
+
+    def setUp(self):
+        self.user = ActiveUser.objects.get(username='user1')
+
+    def create_thread(self, number):
+        targets = [User.objects.create_user(username='fake%d-%d' % (number, i)) for i in range(number)]
+        return Thread.objects.create_thread(self.user, 'Hello', 'Hello World!', targets).thread
+
+    def count_queries(self, thread):
+        with CaptureQueriesContext(connection) as context:
+            thread.post_message(self.user, 'Hello again!')
+        return len(context)
+
+    def test_queries(self):
+        expected = self.count_queries(self.create_thread(2))
+        self.assertEqual(self.count_queries(self.create_thread(20)), expected)
+
+    def test_boxes(self):
+        thread = self.create_thread(3)
+        boxes = list(MessageBox.objects.filter(thread=thread).exclude(user=self.user).order_by('pk'))
+        boxes[0].mark_archived()
+        boxes[1].mark_deleted()
+        boxes[2].mark_read()
+
+        thread.post_message(boxes[2].user, 'Hello user1!')
+        thread = Thread.objects.get(pk=thread.pk)
+        self.assertEqual(thread.last_message.text, 'Hello user1!')
+        for box in MessageBox.objects.filter(thread=thread):
+            self.assertEqual(box.status, MessageBox.STATUS_NORMAL)
+            self.assertEqual(box.is_read, box.user == boxes[2].user)
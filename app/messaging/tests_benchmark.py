@@ -0,0 +1,59 @@
+from django.contrib.auth.models import User
+from django.utils.timezone import now
+
+from helpers.benchmark import LexpageBenchmarkTestCase
+from profile.models import ActiveUser
+from messaging.models import Thread, Message, MessageBox
+
+
+def legacy_post_message(thread, user, text):
+    """
+    Thread.post_message, as it was implemented before the MessageBoxes were
+    updated with set-based statements. Kept as a reference.
+    """
+    message = Message(author=user, thread=thread, text=text)
+    message.save()
+
+    thread.last_message = message
+    thread.save()
+
+    for message_box in MessageBox.objects.filter(thread=thread):
+        if message_box.status in (MessageBox.STATUS_DELETED, MessageBox.STATUS_ARCHIVED):
+            message_box.mark_normal()
+        message_box.save()
+
+    message_box = MessageBox.objects.get(user=user, thread=thread)
+    message_box.date_read = now()
+    message_box.save()
+    message_box.save()
+
+
+class PostMessageBenchmark(LexpageBenchmarkTestCase):
+    fixtures = ['devel']
+    participants = 60
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = ActiveUser.objects.get(username='user1')
+        targets = [User.objects.create_user(username='fake%d' % i, password='fake') for i in range(cls.participants)]
+        cls.thread = Thread.objects.create_thread(cls.user, 'Hello', 'Hello World!', targets).thread
+
+    def test_post_message(self):
+        def archive():
+            # Half of the participants have archived the thread
+            boxes = MessageBox.objects.filter(thread=self.thread).exclude(user=self.user).order_by('pk')
+            MessageBox.objects.filter(pk__in=boxes.values_list('pk', flat=True)[::2]).update(status=MessageBox.STATUS_ARCHIVED)
+
+        def post(function):
+            def run():
+                archive()
+                function(self.thread, self.user, 'Hello again!')
+            return run
+
+        legacy = self.timeit(post(legacy_post_message))
+        current = self.timeit(post(lambda thread, user, text: thread.post_message(user, text)))
+
+        with self.report('Reply in a conversation with {} participants'.format(self.participants + 1)) as lines:
+            lines.append('legacy:  {:.2f}ms'.format(legacy * 1000))
+            lines.append('current: {:.2f}ms'.format(current * 1000))
+        self.assertLess(current, legacy)
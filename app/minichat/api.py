@@ -1,21 +1,17 @@
-import time
 import datetime
 
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.serializers import ModelSerializer, ValidationError
-from rest_framework.generics import CreateAPIView, ListAPIView
-from rest_framework.fields import CharField
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.serializers import ValidationError
+from rest_framework.generics import CreateAPIView
+from rest_framework.views import APIView
+from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.exceptions import APIException
 
-from django.core.cache import cache
+from django.conf import settings
 from .models import Message
-
-from profile.api import UserSerializer
-
-from minichat.templatetags.minichat import urlize3
-from commons.templatetags.markup_bbcode import smiley
+from .broker import get_broker
+from .window import WINDOW_SIZE, MessageSerializer, get_cached_window
 
 
 class BadSubstituteException(APIException):
@@ -23,27 +19,9 @@ class BadSubstituteException(APIException):
     default_detail = 'Malformed substitute'
 
 
-class MinichatTextField(CharField):
-    def to_representation(self, value):
-        return super().to_representation(smiley(urlize3(value)))
-
-
-class MessageSerializer(ModelSerializer):
-    """A serializer for the minichat messages with the enhanced user serializer that comes in the
-    profile app, so we get the username and the avatar in the same request that the minichat
-    messages."""
-    user = UserSerializer()
-
-    class Meta:
-        model = Message
-        fields = ('user', 'text', 'date',)
-
-    def build_standard_field(self, field_name, model_field):
-        field_class, field_kwargs = super(MessageSerializer, self).build_standard_field(field_name, model_field)
-        if field_name == 'text':
-            return MinichatTextField, field_kwargs
-        else:
-            return field_class, field_kwargs
+class BadCursorException(APIException):
+    status_code = 400
+    default_detail = 'Malformed cursor or version'
 
 
 class PostedMessageSerializer(MessageSerializer):
@@ -54,25 +32,109 @@ class PostedMessageSerializer(MessageSerializer):
         fields = ('text',)
 
 
-class MinichatLatestMessagesView(ListAPIView):
-    model = Message
-    serializer_class = MessageSerializer
-
-    def get_queryset(self):
-        return Message.objects.order_by('-date')[:20]
+class MinichatDeltaMixin:
+    """
+    Build the responses of the minichat views from the cached window. A response
+    contains either the latest messages (reset is true), or only what changed since
+    the version known by the client: the messages posted after its cursor, and the
+    messages that were edited (eg. by a substitution). Messages are ordered by
+    decreasing date.
+    """
+    # Messages are public, and are not read through a queryset
+    permission_classes = (AllowAny,)
+
+    def get_parameters(self, request):
+        """
+        Return the cursor (id of the latest message) and the version known by the
+        client, or (None, None) if the client did not provide them.
+        """
+        if 'after' not in request.query_params or 'version' not in request.query_params:
+            return None, None
+        try:
+            return int(request.query_params['after']), int(request.query_params['version'])
+        except ValueError:
+            raise BadCursorException()
+
+    def get_data(self, messages, cursor, version, reset):
+        return {
+            'results': messages,
+            'cursor': cursor,
+            'version': version,
+            'reset': reset,
+        }
+
+    def get_window(self, window):
+        """
+        Return the latest messages.
+        """
+        messages = window['messages']
+        return self.get_data(messages, max([data['id'] for data in messages], default=0), window['version'], True)
+
+    def get_delta(self, after, since, window):
+        """
+        Return the messages that were posted after message *after*, and the ones that were
+        edited since version *since*. The latest messages are returned instead if these
+        changes are not known anymore, if messages were deleted, or if there are too
+        many new messages.
+        """
+        changes = get_broker().get_changes(since, window['version'])
+        if changes is None or any(action == 'delete' for action, pk in changes):
+            return self.get_window(window)
+
+        edited = {pk for action, pk in changes if action == 'update' and pk <= after}
+        messages = [data for data in window['messages'] if data['id'] > after or data['id'] in edited]
+        posted = [data['id'] for data in messages if data['id'] > after]
+        if len(posted) >= WINDOW_SIZE:
+            return self.get_window(window)
+        return self.get_data(messages, max(posted, default=after), window['version'], False)
+
+
+class MinichatLatestMessagesView(MinichatDeltaMixin, APIView):
+    """
+    Return the latest messages, or only the changes since a given version if the
+    `after` (id of the latest message known by the client) and `version` parameters
+    are provided. A 304 is returned if the client is up to date.
+    Messages are read from the cache, see get_cached_window.
+    """
+    def get(self, request, *args, **kwargs):
+        version = get_broker().get_version()
+        after, known_version = self.get_parameters(request)
 
-    def list(self, request, *args, **kwargs):
-        cached_hash = cache.get_or_set('cache-minichat', lambda: str(hash(time.time())), 60)
-        if request.query_params.get('hash', None) == cached_hash:
+        if known_version == version or request.query_params.get('hash', None) == str(version):
             # Manually set the response with content to prevent a bug in Firefox
-            response = Response('1', content_type='text/html', status=status.HTTP_304_NOT_MODIFIED)
+            return Response('1', content_type='text/html', status=status.HTTP_304_NOT_MODIFIED)
+
+        window = get_cached_window(version)
+        if after is None:
+            data = self.get_window(window)
+        else:
+            data = self.get_delta(after, known_version, window)
+        data['hash'] = str(version)
+        return Response(data)
+
+
+class MinichatUpdatesView(MinichatDeltaMixin, APIView):
+    """
+    Long-polling version of MinichatLatestMessagesView, `after` and `version` being
+    mandatory. If the client is up to date, the request is held until the minichat
+    broker publishes a change, or until MINICHAT_LONG_POLL_TIMEOUT expires, in which
+    case an empty response is returned. Idle clients do not hit the database.
+    """
+    def get(self, request, *args, **kwargs):
+        after, version = self.get_parameters(request)
+        if after is None:
+            raise BadCursorException()
+
+        broker = get_broker()
+        current = broker.get_version()
+        if current == version:
+            current = broker.wait(version, settings.MINICHAT_LONG_POLL_TIMEOUT)
+
+        if current == version:
+            data = self.get_data([], after, version, False)
         else:
-            response = super().list(request, *args, **kwargs)
-            response.data = {
-                'results': response.data,
-                'hash': cached_hash
-            }
-        return response
+            data = self.get_delta(after, version, get_cached_window(current))
+        return Response(data)
 
 
 class MinichatMessagePostView(CreateAPIView):
@@ -0,0 +1,151 @@
+"""
+Brokers used to push minichat updates to the clients, see MINICHAT_BROKER setting.
+
+A broker maintains a version number that is bumped each time a message is created,
+edited or deleted (see minichat.signals), and remembers the most recent changes so
+clients can be sent what changed since the version they know. Long-polling requests
+wait for this version to change instead of repeatedly querying the database.
+"""
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+
+_broker = None
+
+
+def get_broker():
+    """
+    Return an instance of the broker defined by MINICHAT_BROKER.
+    """
+    global _broker
+    if _broker is None:
+        _broker = import_string(settings.MINICHAT_BROKER)()
+    return _broker
+
+
+class BaseBroker:
+    # Number of changes that are remembered
+    max_changes = 100
+
+    def get_version(self):
+        """
+        Return the current version.
+        """
+        raise NotImplementedError()
+
+    def publish(self, change):
+        """
+        Record given change and notify waiting clients.
+        :param change: (action, message id) tuple, action being 'create', 'update' or 'delete'
+        :return: the new version
+        """
+        raise NotImplementedError()
+
+    def get_changes(self, since, until):
+        """
+        Return the list of changes that were published after version *since*, up to
+        version *until* (included), or None if they are not all known anymore.
+        """
+        raise NotImplementedError()
+
+    def wait(self, version, timeout):
+        """
+        Block until the current version differs from given one, or until timeout expires.
+        :param version: version known by the client
+        :param timeout: maximum waiting time, in seconds
+        :return: the current version
+        """
+        raise NotImplementedError()
+
+
+class LocalBroker(BaseBroker):
+    """
+    In-process broker. Waiting clients are woken up as soon as a change is published,
+    but changes made by another process are not seen: only suitable for a single process.
+    """
+    def __init__(self):
+        self._condition = threading.Condition()
+        # Start from the current time, so a restarted process never reuses a version
+        self._version = int(time.time() * 1000000)
+        self._changes = deque(maxlen=self.max_changes)
+
+    def get_version(self):
+        return self._version
+
+    def publish(self, change):
+        with self._condition:
+            self._version += 1
+            self._changes.append(tuple(change))
+            self._condition.notify_all()
+            return self._version
+
+    def get_changes(self, since, until):
+        with self._condition:
+            # Version of the first remembered change
+            first = self._version - len(self._changes) + 1
+            if since > until or since + 1 < first or until > self._version:
+                return None
+            return list(self._changes)[since + 1 - first:until + 1 - first]
+
+    def wait(self, version, timeout):
+        with self._condition:
+            self._condition.wait_for(lambda: self._version != version, timeout)
+            return self._version
+
+
+class CacheBroker(BaseBroker):
+    """
+    Broker that stores the version in the cache, so it is shared by every process
+    using the same cache. Waiting clients check the cache every *interval* seconds.
+    """
+    key = 'minichat-version'
+    change_key = 'minichat-change-{}'
+    change_timeout = 60 * 60
+    interval = 0.5
+
+    def get_version(self):
+        version = cache.get(self.key)
+        if version is None:
+            # Version was never published, or was evicted from the cache
+            self.add_version()
+            version = cache.get(self.key, 0)
+        return version
+
+    def add_version(self):
+        """
+        Start the version from the current time, so a version evicted from the cache
+        (or lost by a restart of the cache) is never reused.
+        """
+        cache.add(self.key, int(time.time() * 1000000), None)
+
+    def publish(self, change):
+        try:
+            version = cache.incr(self.key)
+        except ValueError:
+            self.add_version()
+            version = cache.incr(self.key)
+        cache.set(self.change_key.format(version), tuple(change), self.change_timeout)
+        return version
+
+    def get_changes(self, since, until):
+        if since > until or until - since > self.max_changes:
+            return None
+        keys = [self.change_key.format(v) for v in range(since + 1, until + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) < len(keys):
+            # Some changes expired, or are not stored yet
+            return None
+        return [tuple(changes[key]) for key in keys]
+
+    def wait(self, version, timeout):
+        deadline = time.monotonic() + timeout
+        current = self.get_version()
+        while current == version and time.monotonic() < deadline:
+            time.sleep(min(self.interval, max(0, deadline - time.monotonic())))
+            current = self.get_version()
+        return current
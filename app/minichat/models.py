@@ -6,6 +6,16 @@ import re
 from profile.models import ActiveUser
 
 
+ANCHOR_RE = re.compile(r'@([\w\-_]+)(\b|\W)')
+
+
+def find_anchors(text):
+    """
+    Return the candidate usernames targeted by the @anchors of given text.
+    """
+    return [x[0] for x in ANCHOR_RE.findall(text)]
+
+
 class Message(models.Model):
     user = models.ForeignKey(User, related_name='+')
     text = models.CharField(max_length=180, verbose_name='Message')
@@ -17,18 +27,15 @@ class Message(models.Model):
         valid user that are targeted by such anchors.
         :return: List of users
         """
-        candidates = [x[0] for x in re.findall(r'@([\w\-_]+)(\b|\W)', self.text)]
+        return ActiveUser.objects.in_usernames(find_anchors(self.text))
 
-        # Filter valid candidates
-        valid_candidates = set()
-        for candidate in candidates:
-            try:
-                user = ActiveUser.objects.all().get(username__iexact=candidate)
-                valid_candidates.add(user)
-            except ActiveUser.DoesNotExist:
-                pass
-
-        return list(valid_candidates)
+    def parse_anchor_ids(self):
+        """
+        Same as parse_anchors, but return the ids of the users. No query is done
+        if the username index is cached, see ActiveUser.objects.get_username_index.
+        :return: List of user ids
+        """
+        return ActiveUser.objects.get_ids_by_usernames(find_anchors(self.text))
 
     def substitute(self):
         """
@@ -1,39 +1,48 @@
 from django.db.models.signals import post_save, post_delete, pre_save, pre_delete
 from django.dispatch import receiver
-from django.core.cache import cache
 from django.template.defaultfilters import force_escape
 
 from helpers.decorators import signal_ignore_fixture
 from notifications.models import Notification
 
 from .models import Message
+from .broker import get_broker
+from .window import update_cached_window
 
 
 @receiver(post_delete, sender=Message)
 @receiver(post_save, sender=Message)
 @signal_ignore_fixture
-def update_cached_etag(*args, **kwargs):
-    cache.delete('cache-minichat')
+def update_cached_etag(sender, instance, **kwargs):
+    """
+    Bump the version of the minichat, record the change, wake up the clients
+    that are waiting for updates and update the cached window of latest messages.
+    """
+    if kwargs['signal'] is post_delete:
+        action = 'delete'
+    elif kwargs.get('created', False):
+        action = 'create'
+    else:
+        action = 'update'
+    version = get_broker().publish((action, instance.pk))
+    update_cached_window(version, action, instance)
 
 
-def create_minichat_notification(user, message):
+def get_notification_fields(message):
     """
-    Send a notification to target user to warn him that someone has
-    said his name in the minichat.
+    Return the fields of the notification sent to the users that are
+    targeted by the anchors of given message.
     """
     # The following line is commented because it leads to a tiny bug. Indeed, len(urlize3(text) could be greater
     # than len(text), and sometimes greater than 255 chars which is a pain for the field in db and possibly leads to
     # a truncated <a> when displayed.
     # text = smiley(urlize3(message.text))
     text = message.text
-    Notification.objects.get_or_create(
-            recipient=user,
-            title='Minichat',
-            description='%s vous a adressé un message : <br/><em>%s</em>' % (message.user, force_escape(text)),
-            action=message.get_absolute_url(),
-            app='minichat',
-            key=message.pk
-    )
+    return {
+        'title': 'Minichat',
+        'description': '%s vous a adressé un message : <br/><em>%s</em>' % (message.user, force_escape(text)),
+        'action': message.get_absolute_url(),
+    }
 
 
 @receiver(pre_delete, sender=Message)
@@ -51,35 +60,21 @@ def remove_notifications_on_message_deletion(sender, **kwargs):
 @signal_ignore_fixture
 def change_notifications_on_message_edition(sender, **kwargs):
     """
-    If message has changed, remove the old uneeded notifications and add the new ones.
+    If message has changed, remove the old uneeded notifications, update the ones
+    that were not dismissed and add the new ones.
     """
     new_message = kwargs['instance']
 
     if new_message.id:
-        old_message = Message.objects.get(pk=new_message.id)
-        old_recipients = set(old_message.parse_anchors())
-        new_recipients = set(new_message.parse_anchors())
-
-        # Delete notifications for recipients that were removed
-        for recipient in old_recipients.difference(new_recipients):
-            try:
-                Notification.objects.get(app='minichat', key=old_message.id, recipient=recipient).delete()
-            except Notification.DoesNotExist:
-                pass
-
-        # Recreate notifications for recipients that still have the notification
-        #   because notification text must be adapted.
-        for recipient in new_recipients.intersection(old_recipients):
-            try:
-                Notification.objects.get(app='minichat', key=old_message.id, recipient=recipient).delete()
-                create_minichat_notification(recipient, new_message)
-            except Notification.DoesNotExist:
-                pass
-
-        # Create notifications for recipients that were added
-        for recipient in new_recipients.difference(old_recipients):
-            create_minichat_notification(recipient, new_message)
+        # Message.substitute keeps the old text, no need to load it again
+        old_text = getattr(new_message, 'old_text', None)
+        if old_text is None:
+            old_text = Message.objects.filter(pk=new_message.id).values_list('text', flat=True).first() or ''
+        old_message = Message(text=old_text)
 
+        Notification.objects.update_recipients('minichat', new_message.id,
+                                               old_message.parse_anchor_ids(), new_message.parse_anchor_ids(),
+                                               **get_notification_fields(new_message))
 
 
 @receiver(post_save, sender=Message)
@@ -90,6 +85,5 @@ def send_notifications_on_message_creation(sender, created, **kwargs):
     """
     if created:
         message = kwargs['instance']
-        anchors = message.parse_anchors()
-        for anchor in anchors:
-            create_minichat_notification(anchor, message)
\ No newline at end of file
+        Notification.objects.update_recipients('minichat', message.id, [], message.parse_anchor_ids(),
+                                               **get_notification_fields(message))
@@ -1,15 +1,21 @@
-function Minichat(username, last_visit, container_selector, form_selector, content_url) {
+function Minichat(username, last_visit, container_selector, form_selector, content_url, updates_url) {
     "use strict";
 
     this.timer_delay = (username && username != "") ? 10 : 30;
     this.split_delay = 5 * 60;
     this.timeout_id = null;
-    this.last_hash = null;
+    this.updates_xhr = null;
+
+    // Last messages, cursor and version, used to only fetch changes
+    this.messages = [];
+    this.cursor = null;
+    this.version = null;
 
     this.username = username;
     this.read_date = last_visit;
 
     this.content_url = content_url;
+    this.updates_url = updates_url;
     this.template = "minichat/latests.html"
 
     this.container_selector = container_selector;
@@ -79,6 +85,10 @@ function Minichat(username, last_visit, container_selector, form_selector, conte
             clearTimeout(_this.timeout_id);
             _this.timeout_id = null;
         }
+        if (_this.updates_xhr) {
+            _this.updates_xhr.abort();
+            _this.updates_xhr = null;
+        }
     };
 
     this.start_timer = function() {
@@ -92,7 +102,9 @@ function Minichat(username, last_visit, container_selector, form_selector, conte
         var _this = this;
 
         _this.start_timer();
-        _this.last_hash = null;
+        _this.messages = [];
+        _this.cursor = null;
+        _this.version = null;
         _this.refresh_content_with([]);
         _this.update_chars_count();
     };
@@ -114,12 +126,17 @@ function Minichat(username, last_visit, container_selector, form_selector, conte
         // Prevent race condition
         _this.stop_timer();
 
-        $.get(_this.content_url + "?hash=" + _this.last_hash).success(function (data, textStatus, xhr) {
-            if (data && (!_this.last_hash || _this.last_hash != data.hash)) {
-                _this.last_hash = data.hash;
-                _this.refresh_content_with(data.results)
+        var params = (_this.cursor !== null) ? {'after': _this.cursor, 'version': _this.version} : {};
+        $.get(_this.content_url, params).success(function (data, textStatus, xhr) {
+            // Nothing is sent if nothing changed (304)
+            if (data && data.results) {
+                _this.apply_changes(data);
+            }
+            if (_this.updates_url && _this.cursor !== null) {
+                _this.wait_updates();
+            } else {
+                _this.start_timer();
             }
-            _this.start_timer();
         }).fail(function (data, textStatus) {
             // contrib_message('danger', 'Une erreur est survenue pendant le chargement du minichat. Veuillez rafraichir la page.');
             console.log(data);
@@ -127,6 +144,41 @@ function Minichat(username, last_visit, container_selector, form_selector, conte
         });
     };
 
+    this.apply_changes = function (data) {
+        var _this = this;
+
+        // Either the latest messages, or the new and edited ones
+        var messages = data.reset ? [] : _this.messages;
+        var ids = _.pluck(data.results, 'id');
+        messages = _.reject(messages, function (message) { return _.contains(ids, message.id); });
+        messages = _.sortBy(data.results.concat(messages), function (message) { return -moment(message.date).valueOf(); });
+
+        _this.messages = messages.slice(0, 20);
+        _this.cursor = data.cursor;
+        _this.version = data.version;
+        _this.refresh_content_with(_this.messages);
+    };
+
+    this.wait_updates = function () {
+        var _this = this;
+
+        // The server holds the request until something changes, or until it times out
+        _this.updates_xhr = $.get(_this.updates_url, {'after': _this.cursor, 'version': _this.version});
+        _this.updates_xhr.success(function (data) {
+            _this.updates_xhr = null;
+            if (data.version != _this.version) {
+                _this.apply_changes(data);
+            }
+            _this.wait_updates();
+        }).fail(function (data, textStatus) {
+            _this.updates_xhr = null;
+            if (textStatus != "abort") {
+                // Fallback to polling
+                _this.start_timer();
+            }
+        });
+    };
+
     this.post_message = function () {
         var _this = this;
 
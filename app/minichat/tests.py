@@ -1,11 +1,17 @@
+import threading
 import time
 from datetime import timedelta
+from unittest import mock
 
 from django.contrib.auth.models import User
 from django.core.cache import cache
 from django.core.urlresolvers import reverse
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils.lorem_ipsum import words
+from minichat import window
+from minichat.broker import LocalBroker, CacheBroker, get_broker
 from minichat.models import Message
 from notifications.models import Notification
 from rest_framework.test import APITestCase
@@ -53,6 +59,28 @@ class AnchorTests(TestCase):
             message = Message(user=self.users[0], text=frmt.format(self.users[0].get_username(), self.users[1].get_username()))
             self.assertListEqual(message.parse_anchors(), [self.users[0], self.users[1]], msg='format: %s' % frmt)
 
+    def test_case_and_duplicates(self):
+        username = self.users[1].get_username()
+        message = Message(user=self.users[0], text='@{} @{} @{}'.format(username.upper(), username, username.lower()))
+        self.assertListEqual(message.parse_anchors(), [self.users[1]])
+        self.assertListEqual(message.parse_anchor_ids(), [self.users[1].pk])
+
+    def test_username_index(self):
+        message = Message(user=self.users[0], text='Hello @newcomer and @{}'.format(self.users[0].get_username()))
+        self.assertListEqual(message.parse_anchors(), [self.users[0]])
+        with self.assertNumQueries(1):
+            message.parse_anchors()
+        with self.assertNumQueries(0):
+            message.parse_anchor_ids()
+
+        # The index is updated when users are created, renamed or deactivated
+        newcomer = User.objects.create_user(username='Newcomer', password='newcomer')
+        self.assertListEqual(message.parse_anchors(), [newcomer, self.users[0]])
+        user = self.users[0]
+        user.is_active = False
+        user.save()
+        self.assertListEqual(message.parse_anchors(), [newcomer])
+
     def test_invalid(self):
         anchored = self.users[:2]
         formats = [
@@ -210,6 +238,35 @@ class ApiTests(APITestCase):
         self.assertEqual(len(Notification.objects.all()), 3)
         self.client.logout()
 
+    def test_notifications_queries(self):
+        usernames = ['fake{}'.format(i) for i in range(5)]
+        for username in usernames:
+            User.objects.create_user(username=username, password=username)
+        self.client.login(username='user1', password='user1')
+        Notification.objects.all().delete()
+
+        # Fill the username index, and warm up the session
+        Message(user=self.author, text='@admin').parse_anchor_ids()
+        self.client.post(reverse('minichat_post'), {'text': 'Hello'})
+
+        def count_queries(text):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.post(reverse('minichat_post'), {'text': text})
+                self.assertIn(response.status_code, (200, 201))
+            return len(context.captured_queries)
+
+        one = count_queries('hello @fake0')
+        several = count_queries('hello @' + ' @'.join(usernames))
+        self.assertEqual(one, several)
+        self.assertEqual(len(Notification.objects.all()), 6)
+
+        several = count_queries('s/hello/salut')
+        self.assertIn('salut', Notification.objects.get(recipient__username='fake1').description)
+        count_queries('bye @fake0')
+        one = count_queries('s/bye/ciao')
+        self.assertEqual(one, several)
+        self.assertEqual(len(Notification.objects.all()), 7)
+
     def test_post_login(self):
         self.client.login(username='user1', password='user1')
         response = self.client.post(reverse('minichat_post'), {'text': 'Hello World!'})
@@ -230,8 +287,8 @@ class ApiTests(APITestCase):
         self.assertEqual(len(response.data['results']), 20)
 
         first_message = response.data['results'][0]
-        # Striclty check the fields to avoir extra disclosure (field id is not sent)
-        self.assertEqual(set(first_message.keys()), {'user', 'text', 'date'})
+        # Striclty check the fields to avoir extra disclosure (id is needed to apply edits)
+        self.assertEqual(set(first_message.keys()), {'id', 'user', 'text', 'date'})
 
         # Striclty check the fields to avoir extra disclosure (we should only send username
         # and profile, not password, email, ...)
@@ -307,3 +364,269 @@ class MinichatCachingTests(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertNotEqual(self.last_hash, response.data['hash'])
         self.assertNotEqual(last_hash, response.data['hash'])
+
+
+class BrokerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def check_broker(self, broker):
+        version = broker.get_version()
+        self.assertEqual(broker.wait(version, 0.01), version)
+
+        new_version = broker.publish(('create', 1))
+        self.assertNotEqual(new_version, version)
+        self.assertEqual(broker.get_version(), new_version)
+        self.assertEqual(broker.wait(version, 10), new_version)
+
+        # Waiting clients are woken up on publication
+        timer = threading.Timer(0.1, broker.publish, [('update', 1)])
+        timer.start()
+        start = time.monotonic()
+        self.assertNotEqual(broker.wait(new_version, 10), new_version)
+        self.assertLess(time.monotonic() - start, 5)
+        timer.join()
+
+        # Changes
+        current = broker.get_version()
+        self.assertEqual(broker.get_changes(version, current), [('create', 1), ('update', 1)])
+        self.assertEqual(broker.get_changes(new_version, current), [('update', 1)])
+        self.assertEqual(broker.get_changes(current, current), [])
+        self.assertIsNone(broker.get_changes(current + 1, current))
+        for i in range(broker.max_changes):
+            broker.publish(('delete', i))
+        self.assertIsNone(broker.get_changes(version, broker.get_version()))
+        self.assertEqual(len(broker.get_changes(current, broker.get_version())), broker.max_changes)
+
+    def test_local_broker(self):
+        broker = LocalBroker()
+        self.check_broker(broker)
+        # A restarted process does not reuse the versions
+        self.assertGreater(LocalBroker().get_version(), broker.get_version())
+
+    def test_cache_broker(self):
+        self.check_broker(CacheBroker())
+
+    def test_cache_broker_eviction(self):
+        broker = CacheBroker()
+        known = broker.publish(('create', 1))
+        cache.delete(CacheBroker.key)
+        # Versions that were seen by the clients are not reused
+        version = broker.get_version()
+        self.assertGreater(version, known)
+        self.assertEqual(broker.publish(('create', 2)), version + 1)
+        self.assertEqual(broker.get_changes(version, version + 1), [('create', 2)])
+        cache.delete(CacheBroker.change_key.format(version + 1))
+        self.assertIsNone(broker.get_changes(version, version + 1))
+
+        cache.delete(CacheBroker.key)
+        self.assertGreater(broker.publish(('create', 3)), version + 1)
+
+
+class MinichatDeltaTests(APITestCase):
+    fixtures = ['devel']
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.all()[0]
+        self.url = reverse('minichat_latest_view')
+
+        response = self.client.get(self.url)
+        self.assertTrue(response.data['reset'])
+        self.cursor = response.data['cursor']
+        self.version = response.data['version']
+        self.assertEqual(self.cursor, Message.objects.latest().pk)
+
+    def get_delta(self, cursor, version):
+        response = self.client.get(self.url, {'after': cursor, 'version': version})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_up_to_date(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'after': self.cursor, 'version': self.version})
+        self.assertEqual(response.status_code, 304)
+
+    def test_invalid_parameters(self):
+        response = self.client.get(self.url, {'after': 'abc', 'version': self.version})
+        self.assertEqual(response.status_code, 400)
+
+    def test_new_messages(self):
+        Message.objects.create(user=self.author, text='First')
+        Message.objects.create(user=self.author, text='Second')
+
+        data = self.get_delta(self.cursor, self.version)
+        self.assertFalse(data['reset'])
+        self.assertEqual([message['text'] for message in data['results']], ['Second', 'First'])
+        self.assertEqual(data['cursor'], Message.objects.latest().pk)
+        self.assertEqual(data['hash'], str(data['version']))
+
+        response = self.client.get(self.url, {'after': data['cursor'], 'version': data['version']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_edition(self):
+        message = Message.objects.latest()
+        message.text = 'Edited'
+        message.save()
+        Message.objects.create(user=self.author, text='New')
+
+        data = self.get_delta(self.cursor, self.version)
+        self.assertFalse(data['reset'])
+        self.assertEqual([(m['id'], m['text']) for m in data['results']],
+                         [(Message.objects.latest().pk, 'New'), (message.pk, 'Edited')])
+
+    def test_substitution(self):
+        self.client.login(username='user1', password='user1')
+        self.client.post(reverse('minichat_post'), {'text': 'Hello World!'})
+        data = self.get_delta(self.cursor, self.version)
+
+        self.client.post(reverse('minichat_post'), {'text': 's/World/John'})
+        data = self.get_delta(data['cursor'], data['version'])
+        self.assertFalse(data['reset'])
+        self.assertEqual([message['text'] for message in data['results']], ['Hello John!'])
+
+    def test_deletion(self):
+        Message.objects.latest().delete()
+        data = self.get_delta(self.cursor, self.version)
+        self.assertTrue(data['reset'])
+        self.assertEqual(data['cursor'], Message.objects.latest().pk)
+
+    def test_unknown_version(self):
+        data = self.get_delta(self.cursor, self.version + 1000)
+        self.assertTrue(data['reset'])
+        self.assertEqual(len(data['results']), min(20, Message.objects.count()))
+
+    def test_many_new_messages(self):
+        for i in range(25):
+            Message.objects.create(user=self.author, text='Message {}'.format(i))
+        data = self.get_delta(self.cursor, self.version)
+        self.assertTrue(data['reset'])
+        self.assertEqual(len(data['results']), 20)
+        self.assertEqual(data['results'][0]['text'], 'Message 24')
+
+
+class MinichatWindowTests(APITestCase):
+    fixtures = ['devel']
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.all()[0]
+        self.url = reverse('minichat_latest_view')
+
+    def get_texts(self):
+        return [message['text'] for message in self.client.get(self.url).data['results']]
+
+    def test_cached(self):
+        texts = self.get_texts()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_texts(), texts)
+
+    def test_incremental_update(self):
+        texts = self.get_texts()
+
+        message = Message.objects.create(user=self.author, text='New :-)')
+        with self.assertNumQueries(0):
+            new_texts = self.get_texts()
+        self.assertIn('smiley', new_texts[0])
+        self.assertEqual(new_texts[1:], texts[:19])
+
+        message.text = 'Edited'
+        message.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_texts(), ['Edited'] + texts[:19])
+
+        message.delete()
+        self.assertEqual(self.get_texts(), texts)
+
+    def test_missed_change(self):
+        self.get_texts()
+        Message.objects.create(user=self.author, text='Missed')
+        Message.objects.create(user=self.author, text='New')
+        cached = cache.get(window.WINDOW_KEY)
+        cached['version'] -= 1
+        cache.set(window.WINDOW_KEY, cached)
+
+        self.assertEqual(self.get_texts()[:2], ['New', 'Missed'])
+
+    def test_concurrent_rebuild(self):
+        # A client reads the version, then a message is created before the window is rebuilt
+        version = get_broker().get_version()
+        with mock.patch('minichat.signals.update_cached_window') as update:
+            message = Message.objects.create(user=self.author, text='New')
+        window.get_cached_window(version)
+        # The change is applied to the rebuilt window
+        window.update_cached_window(*update.call_args[0])
+
+        ids = [data['id'] for data in window.get_cached_window(get_broker().get_version())['messages']]
+        self.assertEqual(ids.count(message.pk), 1)
+        self.assertEqual(self.get_texts().count('New'), 1)
+
+
+@override_settings(MINICHAT_LONG_POLL_TIMEOUT=0.01)
+class MinichatUpdatesTests(APITestCase):
+    fixtures = ['devel']
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.all()[0]
+        self.url = reverse('minichat_updates_view')
+
+        response = self.client.get(reverse('minichat_latest_view'))
+        self.cursor = response.data['cursor']
+        self.version = response.data['version']
+        self.assertEqual(self.cursor, Message.objects.latest().pk)
+
+    def get_updates(self, cursor, version):
+        response = self.client.get(self.url, {'after': cursor, 'version': version})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_invalid_parameters(self):
+        response = self.client.get(self.url, {'after': 'abc', 'version': self.version})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 400)
+
+    def test_no_update(self):
+        with self.assertNumQueries(0):
+            data = self.get_updates(self.cursor, self.version)
+        self.assertEqual(data['results'], [])
+        self.assertEqual(data['cursor'], self.cursor)
+        self.assertEqual(data['version'], self.version)
+
+    def test_new_messages(self):
+        Message.objects.create(user=self.author, text='First')
+        Message.objects.create(user=self.author, text='Second')
+
+        data = self.get_updates(self.cursor, self.version)
+        self.assertEqual([message['text'] for message in data['results']], ['Second', 'First'])
+        self.assertEqual(data['cursor'], Message.objects.latest().pk)
+        self.assertNotEqual(data['version'], self.version)
+
+        data = self.get_updates(data['cursor'], data['version'])
+        self.assertEqual(data['results'], [])
+
+    def test_edition(self):
+        message = Message.objects.latest()
+        message.text = 'Edited'
+        message.save()
+
+        data = self.get_updates(self.cursor, self.version)
+        self.assertEqual([message['text'] for message in data['results']], ['Edited'])
+        self.assertEqual(data['cursor'], self.cursor)
+        self.assertNotEqual(data['version'], self.version)
+
+    def test_wake_up(self):
+        timer = threading.Timer(0.1, lambda: get_broker().publish(('update', self.cursor)))
+        with self.settings(MINICHAT_LONG_POLL_TIMEOUT=10):
+            timer.start()
+            data = self.get_updates(self.cursor, self.version)
+            timer.join()
+        self.assertNotEqual(data['version'], self.version)
+
+    def test_push_setting(self):
+        # Clients only wait for updates if push is enabled
+        with self.settings(MINICHAT_PUSH=False):
+            self.assertNotContains(self.client.get(reverse('homepage')), self.url)
+        with self.settings(MINICHAT_PUSH=True):
+            self.assertContains(self.client.get(reverse('homepage')), self.url)
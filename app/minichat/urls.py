@@ -2,7 +2,7 @@ from django.conf.urls import url
 from django.core.urlresolvers import reverse_lazy
 from django.views.generic import RedirectView
 from .views import MessageListView
-from .api import MinichatLatestMessagesView, MinichatMessagePostView
+from .api import MinichatLatestMessagesView, MinichatMessagePostView, MinichatUpdatesView
 from datetime import date
 
 
@@ -23,4 +23,7 @@ urlpatterns = [
     url(r'api/minichat-api-latest$',
         MinichatLatestMessagesView.as_view(),
         name='minichat_latest_view'),
+    url(r'api/minichat-api-updates$',
+        MinichatUpdatesView.as_view(),
+        name='minichat_updates_view'),
 ]
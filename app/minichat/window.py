@@ -0,0 +1,89 @@
+"""
+Window of the latest messages, kept serialized in the cache so that the minichat
+views do not hit the database. It is read by minichat.api and updated by
+minichat.signals, each change being tagged with the version of the minichat broker.
+"""
+from collections import OrderedDict
+
+from django.core.cache import cache
+from rest_framework.fields import CharField
+from rest_framework.serializers import ModelSerializer
+
+from profile.api import UserSerializer
+from commons.templatetags.markup_bbcode import smiley
+
+from .models import Message
+from .broker import get_broker
+from .templatetags.minichat import urlize3
+
+
+WINDOW_SIZE = 20  # Number of messages sent to the clients
+WINDOW_KEY = 'minichat-window'
+
+
+class MinichatTextField(CharField):
+    def to_representation(self, value):
+        return super().to_representation(smiley(urlize3(value)))
+
+
+class MessageSerializer(ModelSerializer):
+    """A serializer for the minichat messages with the enhanced user serializer that comes in the
+    profile app, so we get the username and the avatar in the same request that the minichat
+    messages."""
+    user = UserSerializer()
+
+    class Meta:
+        model = Message
+        fields = ('id', 'user', 'text', 'date',)
+
+    def build_standard_field(self, field_name, model_field):
+        field_class, field_kwargs = super(MessageSerializer, self).build_standard_field(field_name, model_field)
+        if field_name == 'text':
+            return MinichatTextField, field_kwargs
+        else:
+            return field_class, field_kwargs
+
+
+def serialize_messages(messages):
+    return [OrderedDict(data) for data in MessageSerializer(messages, many=True).data]
+
+
+def get_cached_window(version):
+    """
+    Return the latest messages, already serialized, as a dict with *version* and
+    *messages* keys. The window is kept in the cache, and rebuilt if it is older
+    than given version of the minichat.
+    """
+    window = cache.get(WINDOW_KEY)
+    if window is None or window['version'] < version:
+        messages = serialize_messages(Message.objects.select_related('user__profile').order_by('-date')[:WINDOW_SIZE])
+        # The version is read after the query: the window contains at least the changes
+        # up to this version, so that the following ones are not applied twice
+        window = {'version': max(version, get_broker().get_version()), 'messages': messages}
+        cache.set(WINDOW_KEY, window, None)
+    return window
+
+
+def update_cached_window(version, action, message):
+    """
+    Apply a change to the cached window, see minichat.signals. The window is dropped
+    (and will be rebuilt on next read) if it missed a previous change, or if a message
+    is removed from it.
+    :param version: version of the minichat after the change
+    :param action: 'create', 'update' or 'delete'
+    :param message: changed message
+    """
+    window = cache.get(WINDOW_KEY)
+    if window is None:
+        return
+    messages = window['messages']
+    position = next((i for i, data in enumerate(messages) if data['id'] == message.pk), None)
+
+    if window['version'] != version - 1 or (action == 'delete' and position is not None):
+        cache.delete(WINDOW_KEY)
+        return
+    if action == 'create' and position is None:
+        messages = serialize_messages([message]) + messages[:WINDOW_SIZE - 1]
+    elif action == 'update' and position is not None:
+        messages = messages[:position] + serialize_messages([message]) + messages[position + 1:]
+    cache.set(WINDOW_KEY, {'version': version, 'messages': messages}, None)
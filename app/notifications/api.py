@@ -1,12 +1,13 @@
-import time
-
+from collections import OrderedDict
 
+from django.conf import settings
 from django.core.cache import cache
 
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.serializers import ModelSerializer
-from rest_framework.generics import ListAPIView, DestroyAPIView
+from rest_framework.generics import DestroyAPIView
+from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.fields import CharField
 
@@ -40,23 +41,56 @@ class NotificationApiView(DestroyAPIView):
         return response
 
 
-class NotificationsListApiView(ListAPIView):
-    model = Notification
-    serializer_class = NotificationSerializer
-    permission_classes = (IsAuthenticated,)
+def get_cached_notifications(user, version=None):
+    """
+    Return the serialized notifications of given user. They are kept in the cache
+    under the version of the notifications of the user, so they are never outdated.
+    """
+    if version is None:
+        version = Notification.objects.get_version(user.pk)
+    key = 'notifications-{}-{}'.format(user.pk, version)
+    notifications = cache.get(key)
+    if notifications is None:
+        notifications = [OrderedDict(data) for data in
+                         NotificationSerializer(Notification.objects.filter(recipient=user), many=True).data]
+        cache.set(key, notifications, 60 * 60 * 24)
+    return notifications
 
-    def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user)
 
-    def list(self, request, *args, **kwargs):
-        cached_hash = cache.get_or_set('cache-notifications-{}'.format(request.user.username), lambda: str(hash(time.time())), 60)
-        if request.query_params.get('hash', None) == cached_hash:
+class NotificationsListApiView(APIView):
+    """
+    Return the notifications of current user, and their version (`hash`).
+    A 304 is returned if given `hash` is the current version.
+    """
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, *args, **kwargs):
+        version = Notification.objects.get_version(request.user.pk)
+        if request.query_params.get('hash', None) == str(version):
             # Manually set the response with content to prevent a bug in Firefox
-            response = Response('1', content_type='text/html', status=status.HTTP_304_NOT_MODIFIED)
-        else:
-            response = super().list(request, *args, **kwargs)
-            response.data = {
-                'results': response.data,
-                'hash': cached_hash
-            }
-        return response
+            return Response('1', content_type='text/html', status=status.HTTP_304_NOT_MODIFIED)
+        return Response({
+            'results': get_cached_notifications(request.user, version),
+            'hash': str(version),
+        })
+
+
+class NotificationsUpdatesApiView(APIView):
+    """
+    Long-polling version of NotificationsListApiView: if `hash` is the current version,
+    the request is held until the notifications of current user change, or until
+    NOTIFICATIONS_LONG_POLL_TIMEOUT expires, in which case a 304 is returned.
+    """
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, *args, **kwargs):
+        version = Notification.objects.get_version(request.user.pk)
+        if request.query_params.get('hash', None) == str(version):
+            version = Notification.objects.wait_version(request.user.pk, version,
+                                                        settings.NOTIFICATIONS_LONG_POLL_TIMEOUT)
+            if request.query_params['hash'] == str(version):
+                return Response('1', content_type='text/html', status=status.HTTP_304_NOT_MODIFIED)
+        return Response({
+            'results': get_cached_notifications(request.user, version),
+            'hash': str(version),
+        })
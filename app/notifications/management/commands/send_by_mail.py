@@ -1,12 +1,15 @@
 from commons.context_processors import global_settings
-from django.core.management.base import NoArgsCommand
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
 from django.conf import settings
-from django.template.loader import render_to_string
+from django.template.loader import get_template
 from notifications.models import Notification
+from itertools import groupby
 import datetime
+import time
 
 
-class Command(NoArgsCommand):
+class Command(BaseCommand):
     help = "Send a mail notification for (unread) pending notifications."
 
     # A mail will be sent only if there exists a pending notification
@@ -14,53 +17,89 @@ class Command(NoArgsCommand):
     min_delay = datetime.timedelta(days=2)
     max_delay = datetime.timedelta(days=3)
 
-    # We assume that cron calls this task only once per hour, on a 
-    # fixed basis. task_hours stores the hours at which a mail could be 
-    # sent. 
+    # We assume that cron calls this task only once per hour, on a
+    # fixed basis. task_hours stores the hours at which a mail could be
+    # sent.
     task_hours = [12]
 
-    def send_mail_notification(self, user):
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', default=False,
+                            help='Send the mails even if current hour is not in task_hours.')
+        parser.add_argument('--dry-run', action='store_true', default=False,
+                            help='Use the locmem email backend instead of sending the mails, and report timings.')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Number of mails sent at once over the connection.')
+
+    def get_digests(self, min_date, max_date):
         """
-        Send a mail to the user with a list of its pending notifications. 
+        Yield (user, notifications) for each user having a pending notification
+        that is older than min_date and younger than max_date, using a single query.
         """
+        recipients = Notification.objects.filter(date__gte=max_date, date__lt=min_date).values('recipient_id')
+        notifications = (Notification.objects.filter(recipient_id__in=recipients)
+                         .select_related('recipient')
+                         .order_by('recipient_id', 'date'))
 
-        # Get its notifications
-        notifications = Notification.objects.filter(recipient=user)
+        for recipient_id, group in groupby(notifications.iterator(), key=lambda notification: notification.recipient_id):
+            group = list(group)
+            yield group[0].recipient, group
 
-        # Render the mail template
-        context = {'user': user, 
-                    'notifications': notifications}
-        context.update(global_settings())
+    def get_mail(self, user, notifications):
+        """
+        Return the mail listing the pending notifications of given user.
+        """
+        context = {'user': user,
+                   'notifications': notifications}
+        context.update(self.settings_context)
 
-        subject = render_to_string('notifications/mail_subject.txt', context)
-        text = render_to_string('notifications/mail_content.txt', context)
+        subject = self.subject_template.render(context)
+        text = self.text_template.render(context)
+        return EmailMessage(subject, text, settings.DEFAULT_FROM_EMAIL, [user.email], connection=self.connection)
 
-        # Send it!
-        # print 'user: %s\nsubject: %s\ntext: %s' % (user.username, subject, text)
-        if user.email:
-          user.email_user(subject, text, settings.DEFAULT_FROM_EMAIL)
-          print('Mail sent to %s (%s)' % (user.username, user.email))
+    def send(self, mails):
+        """
+        Send given mails at once, over the connection of the command.
+        """
+        if mails:
+            self.connection.send_messages(mails)
+        for mail in mails:
+            self.stdout.write('Mail sent to %s' % ', '.join(mail.to))
 
-    def handle_noargs(self, **options):
-        # Check if current hour is in task_hours. If not, stop. 
-        if not (datetime.datetime.now().hour in Command.task_hours):
+    def handle(self, *args, **options):
+        # Check if current hour is in task_hours. If not, stop.
+        if not options['force'] and not (datetime.datetime.now().hour in Command.task_hours):
             return
 
-        print('Task: notifications by mail.')
-        
+        self.stdout.write('Task: notifications by mail.')
+        start = time.perf_counter()
+
         min_date = datetime.datetime.now() - Command.min_delay
         max_date = datetime.datetime.now() - Command.max_delay
 
-        # Retrieve the list of pending notifications
-        notifications = Notification.objects.filter(date__gte=max_date, date__lt=min_date)
-        users = set()
+        # Templates and settings are the same for every mail
+        self.subject_template = get_template('notifications/mail_subject.txt')
+        self.text_template = get_template('notifications/mail_content.txt')
+        self.settings_context = global_settings()
 
-        # Get a list of users to warn. 
-        for notification in notifications:
-            users.add(notification.recipient)
+        backend = 'django.core.mail.backends.locmem.EmailBackend' if options['dry_run'] else None
+        self.connection = get_connection(backend)
+        self.connection.open()
 
-        # Send a mail to each user. 
-        for user in users:
-            self.send_mail_notification(user)
+        sent = 0
+        try:
+            mails = []
+            for user, notifications in self.get_digests(min_date, max_date):
+                if not user.email:
+                    continue
+                mails.append(self.get_mail(user, notifications))
+                if len(mails) >= options['batch_size']:
+                    self.send(mails)
+                    sent += len(mails)
+                    mails = []
+            self.send(mails)
+            sent += len(mails)
+        finally:
+            self.connection.close()
 
-        return
+        if options['dry_run']:
+            self.stdout.write('%d mails rendered in %.3fs (dry run).' % (sent, time.perf_counter() - start))
@@ -1,5 +1,9 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils import timezone
+
+import time
 from rest_framework.reverse import reverse
 from django.db.utils import IntegrityError
 
@@ -22,6 +26,123 @@ class UniqueNotificationManager(models.Manager):
             notification.save()
             return notification, True
 
+    def bulk_get_or_create(self, recipients, app, key, **fields):
+        """
+        Same as get_or_create, for several recipients at once: one query finds the
+        existing notifications, and one query creates the missing ones.
+        :param recipients: users (or user ids) to notify
+        :param app: app of the notification
+        :param key: key of the notification
+        :param fields: other fields of the notification (title, description, action)
+        :return: the list of created notifications
+        """
+        recipient_ids = []
+        for recipient in recipients:
+            pk = getattr(recipient, 'pk', recipient)
+            if pk not in recipient_ids:
+                recipient_ids.append(pk)
+        if not recipient_ids:
+            return []
+
+        existing = set(self.filter(app=app, key=key, recipient_id__in=recipient_ids)
+                       .values_list('recipient_id', flat=True))
+        return self.create_missing(app, key, [pk for pk in recipient_ids if pk not in existing], **fields)
+
+    def create_missing(self, app, key, recipient_ids, **fields):
+        """
+        Create the notifications of given recipients with one query. If some of them were
+        concurrently created by another request, they are updated with given fields instead.
+        :param app: app of the notification
+        :param key: key of the notification
+        :param recipient_ids: ids of the users that are not notified yet
+        :param fields: other fields of the notification (title, description, action)
+        :return: the list of created notifications
+        """
+        notifications = [Notification(app=app, key=key, recipient_id=pk, **fields) for pk in recipient_ids]
+        if not notifications:
+            return []
+        try:
+            with transaction.atomic():
+                self.bulk_create(notifications)
+        except IntegrityError:
+            existing = set(self.filter(app=app, key=key, recipient_id__in=recipient_ids)
+                           .values_list('recipient_id', flat=True))
+            self.filter(app=app, key=key, recipient_id__in=existing).update(date=timezone.now(), **fields)
+            notifications = [notification for notification in notifications if notification.recipient_id not in existing]
+            self.bulk_create(notifications)
+        # Signals are not sent by update() and bulk_create()
+        self.bump_versions(recipient_ids)
+        return notifications
+
+    def get_version(self, recipient_id):
+        """
+        Return the version of the notifications of given user, which changes each time
+        one of them is created, modified or deleted (see bump_versions).
+        """
+        key = 'notifications-version-{}'.format(recipient_id)
+        version = cache.get(key)
+        if version is None:
+            # Start from the current time, so a version evicted from the cache is never reused
+            cache.add(key, int(time.time() * 1000000), None)
+            version = cache.get(key, 0)
+        return version
+
+    def bump_versions(self, recipient_ids):
+        """
+        Change the version of the notifications of given users.
+        """
+        for pk in recipient_ids:
+            try:
+                cache.incr('notifications-version-{}'.format(pk))
+            except ValueError:
+                # Not in the cache, a new version will be created when needed
+                pass
+
+    def wait_version(self, recipient_id, version, timeout, interval=0.5):
+        """
+        Block until the version of the notifications of given user differs
+        from given one, or until timeout (in seconds) expires.
+        :return: the current version
+        """
+        deadline = time.monotonic() + timeout
+        current = self.get_version(recipient_id)
+        while current == version and time.monotonic() < deadline:
+            time.sleep(min(interval, max(0, deadline - time.monotonic())))
+            current = self.get_version(recipient_id)
+        return current
+
+    def update_recipients(self, app, key, old_recipient_ids, recipient_ids, **fields):
+        """
+        Apply a change of recipients to the notification identified by app and key,
+        using a constant number of queries: notifications of the recipients that were
+        removed are deleted, notifications of the recipients that were kept are updated
+        with given fields (if they were not dismissed), and new recipients are notified.
+        :param app: app of the notification
+        :param key: key of the notification
+        :param old_recipient_ids: ids of the users that were notified
+        :param recipient_ids: ids of the users that must be notified
+        :param fields: other fields of the notification (title, description, action)
+        """
+        old_recipient_ids, recipient_ids = set(old_recipient_ids), set(recipient_ids)
+        if not old_recipient_ids and not recipient_ids:
+            return
+        notifications = self.filter(app=app, key=key)
+        existing = set(notifications.filter(recipient_id__in=old_recipient_ids | recipient_ids)
+                       .values_list('recipient_id', flat=True))
+
+        removed = (old_recipient_ids - recipient_ids) & existing
+        if removed:
+            notifications.filter(recipient_id__in=removed).delete()
+
+        kept = old_recipient_ids & recipient_ids & existing
+        if kept:
+            notifications.filter(recipient_id__in=kept).update(date=timezone.now(), **fields)
+
+        self.create_missing(app, key, recipient_ids - old_recipient_ids - existing, **fields)
+
+        # Signals are not sent by update()
+        self.bump_versions(kept)
+
 
 class Notification(models.Model):
     ICON = {
@@ -1,6 +1,5 @@
 import random
 
-from django.core.cache import cache
 from django.db.models.signals import post_save, post_delete, pre_save, pre_delete
 from django.dispatch import receiver
 
@@ -12,5 +11,4 @@ from notifications.models import Notification
 @receiver(post_save, sender=Notification)
 @signal_ignore_fixture
 def update_cached_etag(*args, **kwargs):
-    username = kwargs['instance'].recipient.username
-    cache.delete('cache-notifications-{}'.format(username))
+    Notification.objects.bump_versions([kwargs['instance'].recipient_id])
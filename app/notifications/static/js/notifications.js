@@ -1,11 +1,13 @@
-function Notifications(container, button_container, url) {
+function Notifications(container, button_container, url, updates_url) {
     "use strict";
 
     this.timer_delay = 10;
     this.timeout_id = null;
     this.last_hash = null;
+    this.updates_xhr = null;
 
     this.content_url = url;
+    this.updates_url = updates_url;
     this.template = "notifications/notifications.html";
     this.template_button = "notifications/button.html";
 
@@ -41,6 +43,10 @@ function Notifications(container, button_container, url) {
             clearTimeout(_this.timeout_id);
             _this.timeout_id = null;
         }
+        if (_this.updates_xhr) {
+            _this.updates_xhr.abort();
+            _this.updates_xhr = null;
+        }
     };
 
     this.start_timer = function() {
@@ -89,7 +95,11 @@ function Notifications(container, button_container, url) {
                 _this.last_hash = data.hash;
                 _this.refresh_content_with({data: data.results})
             }
-            _this.start_timer();
+            if (_this.updates_url) {
+                _this.wait_updates();
+            } else {
+                _this.start_timer();
+            }
         }).fail(function (data, textStatus) {
             document.title = _this.vanilla_title;
             _this.refresh_content_with({data: null, error: true});
@@ -99,6 +109,27 @@ function Notifications(container, button_container, url) {
         });
     };
 
+    this.wait_updates = function () {
+        var _this = this;
+
+        // The server holds the request until something changes, or until it times out (304)
+        _this.updates_xhr = $.get(_this.updates_url + "?hash=" + _this.last_hash);
+        _this.updates_xhr.success(function (data) {
+            _this.updates_xhr = null;
+            if (data && data.hash && _this.last_hash != data.hash) {
+                _this.last_hash = data.hash;
+                _this.refresh_content_with({data: data.results})
+            }
+            _this.wait_updates();
+        }).fail(function (data, textStatus) {
+            _this.updates_xhr = null;
+            if (textStatus != "abort") {
+                // Fallback to polling
+                _this.start_timer();
+            }
+        });
+    };
+
     this.dismiss = function(url, element) {
         var _this = this;
 
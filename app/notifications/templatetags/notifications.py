@@ -1,9 +1,15 @@
 from django import template
-from ..models import Notification
+from django.utils.functional import SimpleLazyObject
+from ..api import get_cached_notifications
 
 register = template.Library()
 
 @register.assignment_tag(takes_context=True)
 def notifications(context):
-    if 'user' in context: 
-        return Notification.objects.filter(recipient=context['user'])
+    """
+    Return the serialized notifications of current user. They are read from
+    the cache, and only if the template uses them.
+    """
+    if 'user' in context and context['user'].is_authenticated():
+        user = context['user']
+        return SimpleLazyObject(lambda: get_cached_notifications(user))
@@ -1,8 +1,20 @@
+import datetime
+import threading
+import time
+from io import StringIO
+from unittest import mock
+
+from django.core import mail
 from django.core.cache import cache
+from django.core.management import call_command
 from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from django.utils.lorem_ipsum import words
 from notifications.models import Notification
+from notifications.templatetags.notifications import notifications
 from rest_framework.test import APITestCase
 
 
@@ -85,6 +97,67 @@ class NotificationTests(APITestCase):
         _, created = Notification.objects.get_or_create(**notification)
         self.assertFalse(created)
 
+    def test_bulk_get_or_create(self):
+        users = [User.objects.create_user(username='fake{}'.format(i), password='fake') for i in range(4)]
+        Notification.objects.get_or_create(recipient=users[0], app='game', key='bar', title='Existing')
+        versions = [Notification.objects.get_version(user.pk) for user in users]
+
+        with CaptureQueriesContext(connection) as context:
+            created = Notification.objects.bulk_get_or_create(users + [users[1].pk], app='game', key='bar', title='New')
+        # One SELECT and one INSERT, savepoints aside
+        self.assertEqual(len([query for query in context.captured_queries if 'SAVEPOINT' not in query['sql']]), 2)
+        self.assertEqual([notification.recipient_id for notification in created], [user.pk for user in users[1:]])
+        self.assertEqual(set(Notification.objects.filter(app='game', key='bar').values_list('recipient_id', 'title')),
+                         {(users[0].pk, 'Existing')} | {(user.pk, 'New') for user in users[1:]})
+
+        # Only the versions of the new recipients change
+        self.assertEqual(Notification.objects.get_version(users[0].pk), versions[0])
+        for user, version in zip(users[1:], versions[1:]):
+            self.assertNotEqual(Notification.objects.get_version(user.pk), version)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(Notification.objects.bulk_get_or_create(users, app='game', key='bar'), [])
+        with self.assertNumQueries(0):
+            self.assertEqual(Notification.objects.bulk_get_or_create([], app='game', key='bar'), [])
+
+    def test_bulk_get_or_create_concurrent(self):
+        users = [User.objects.create_user(username='fake{}'.format(i), password='fake') for i in range(3)]
+        Notification.objects.get_or_create(recipient=users[0], app='game', key='bar', title='Concurrent')
+        version = Notification.objects.get_version(users[0].pk)
+
+        # The notification of users[0] is created by another request after the SELECT
+        real_filter = Notification.objects.filter
+        calls = []
+
+        def filter(*args, **kwargs):
+            calls.append(kwargs)
+            return Notification.objects.none() if len(calls) == 1 else real_filter(*args, **kwargs)
+
+        with mock.patch.object(Notification.objects, 'filter', side_effect=filter):
+            created = Notification.objects.bulk_get_or_create(users, app='game', key='bar', title='New')
+        self.assertEqual([notification.recipient_id for notification in created], [user.pk for user in users[1:]])
+        self.assertEqual(set(Notification.objects.filter(app='game', key='bar').values_list('recipient_id', 'title')),
+                         {(user.pk, 'New') for user in users})
+        self.assertNotEqual(Notification.objects.get_version(users[0].pk), version)
+
+    def test_update_recipients(self):
+        users = [User.objects.create_user(username='fake{}'.format(i), password='fake') for i in range(4)]
+        ids = [user.pk for user in users]
+
+        def recipients():
+            return set(Notification.objects.filter(app='game', key='bar').values_list('recipient_id', 'title'))
+
+        with CaptureQueriesContext(connection) as context:
+            Notification.objects.update_recipients('game', 'bar', [], ids[:3], title='First')
+        self.assertEqual(len([query for query in context.captured_queries if 'SAVEPOINT' not in query['sql']]), 2)
+        self.assertEqual(recipients(), {(pk, 'First') for pk in ids[:3]})
+
+        # Dismissed notifications are not recreated
+        Notification.objects.get(app='game', key='bar', recipient=users[1]).dismiss()
+
+        Notification.objects.update_recipients('game', 'bar', ids[:3], ids[1:], title='Second')
+        self.assertEqual(recipients(), {(ids[2], 'Second'), (ids[3], 'Second')})
+
 
 class NotificationCachingTests(APITestCase):
     def setUp(self):
@@ -150,3 +223,104 @@ class NotificationCachingTests(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertNotEqual(self.last_hash, response.data['hash'])
         self.assertNotEqual(last_hash, response.data['hash'])
+
+
+class NotificationVersionTests(APITestCase):
+    fixtures = ['devel']
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.get(username='user1')
+        self.client.login(username='user1', password='user1')
+        self.url = reverse('notifications_api_list')
+
+    def test_cached_list(self):
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.data['results']), 1)
+        with self.assertNumQueries(2):  # Session and user
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data['results']), 1)
+
+        Notification.objects.get_or_create(recipient=self.user, app='test', key='1', title='Hello World')
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_version(self):
+        version = Notification.objects.get_version(self.user.pk)
+        self.assertEqual(Notification.objects.get_version(self.user.pk), version)
+
+        notification, _ = Notification.objects.get_or_create(recipient=self.user, app='test', key='1', title='Hello')
+        self.assertNotEqual(Notification.objects.get_version(self.user.pk), version)
+        version = Notification.objects.get_version(self.user.pk)
+
+        # Versions of other users are not changed
+        other_version = Notification.objects.get_version(0)
+        notification.dismiss()
+        self.assertNotEqual(Notification.objects.get_version(self.user.pk), version)
+        self.assertEqual(Notification.objects.get_version(0), other_version)
+
+        # A version evicted from the cache is not reused
+        version = Notification.objects.get_version(self.user.pk)
+        cache.delete('notifications-version-{}'.format(self.user.pk))
+        time.sleep(0.01)
+        self.assertGreater(Notification.objects.get_version(self.user.pk), version)
+
+    def test_templatetag(self):
+        with self.assertNumQueries(0):
+            self.assertIsNone(notifications({}))
+            lazy_notifications = notifications({'user': self.user})
+        self.assertEqual(len(lazy_notifications), 1)
+
+    @override_settings(NOTIFICATIONS_LONG_POLL_TIMEOUT=0.01)
+    def test_updates_timeout(self):
+        url = reverse('notifications_api_updates')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(url, {'hash': response.data['hash']})
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(NOTIFICATIONS_LONG_POLL_TIMEOUT=10)
+    def test_updates_wake_up(self):
+        url = reverse('notifications_api_updates')
+        version = self.client.get(url).data['hash']
+
+        timer = threading.Timer(0.1, Notification.objects.bump_versions, [[self.user.pk]])
+        timer.start()
+        response = self.client.get(url, {'hash': version})
+        timer.join()
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.data['hash'], version)
+
+
+class MailDigestTests(APITestCase):
+    fixtures = ['devel']
+
+    def setUp(self):
+        Notification.objects.all().delete()
+        self.users = [User.objects.create_user(username='fake{}'.format(i), email='fake{}@example.com'.format(i),
+                                               password='fake') for i in range(5)]
+        pending = datetime.datetime.now() - datetime.timedelta(days=2, hours=12)
+        for user in self.users:
+            for i in range(3):
+                notification, _ = Notification.objects.get_or_create(recipient=user, app='test', key=str(i),
+                                                                     title='Notification {}'.format(i))
+        Notification.objects.filter(key='0').update(date=pending)
+        # Too recent to be sent
+        Notification.objects.filter(recipient=self.users[0], key='0').update(date=datetime.datetime.now())
+
+    def send(self, **options):
+        call_command('send_by_mail', force=True, stdout=StringIO(), **options)
+
+    def test_digest(self):
+        with self.assertNumQueries(1):
+            self.send(batch_size=2)
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         ['fake{}@example.com'.format(i) for i in range(1, 5)])
+        self.assertIn('Vous avez 3 notifications', mail.outbox[0].body)
+        self.assertIn('Notification 2', mail.outbox[0].body)
+
+    def test_dry_run(self):
+        output = StringIO()
+        call_command('send_by_mail', force=True, dry_run=True, stdout=output)
+        self.assertIn('4 mails rendered', output.getvalue())
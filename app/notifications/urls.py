@@ -1,6 +1,6 @@
 from django.conf.urls import url
 from .views import ShowView
-from .api import NotificationApiView, NotificationsListApiView
+from .api import NotificationApiView, NotificationsListApiView, NotificationsUpdatesApiView
 
 
 urlpatterns = [
@@ -10,6 +10,9 @@ urlpatterns = [
                 url(r'api/notifications$',
                     NotificationsListApiView.as_view(),
                     name='notifications_api_list'),
+                url(r'api/notifications/updates$',
+                    NotificationsUpdatesApiView.as_view(),
+                    name='notifications_api_updates'),
                 url(r'^(?P<pk>\d+)$',
                     ShowView.as_view(),
                     name='notification_show'),
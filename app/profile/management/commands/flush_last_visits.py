@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from profile.visits import flush_visits
+
+
+class Command(BaseCommand):
+    help = "Write the last visits recorded in the cache into the profiles (see LAST_VISIT_WRITE_BEHIND)."
+
+    def handle(self, *args, **options):
+        updated = flush_visits()
+        self.stdout.write('%d profiles updated.' % updated)
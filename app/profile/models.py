@@ -2,6 +2,7 @@ from commons.context_processors import global_settings
 from django.db import models
 from django.conf import settings
 from django.contrib.auth.models import User, UserManager
+from django.core.cache import cache
 from django.template.loader import render_to_string
 from django.core.urlresolvers import reverse
 
@@ -17,9 +18,48 @@ except ImportError:
 
 
 class ActiveUserManager(UserManager):
+    # Cache key of the username index, cleared by profile.signals
+    username_index_key = 'active-usernames'
+
     def get_queryset(self):
         return super(ActiveUserManager, self).get_queryset().filter(is_active=True)
 
+    def get_username_index(self):
+        """
+        Return a dict that maps the lowercased usernames of active users to their id.
+        The index is kept in the cache.
+        """
+        index = cache.get(self.username_index_key)
+        if index is None:
+            index = {}
+            # If two usernames only differ by their case, the oldest account wins
+            for pk, username in self.get_queryset().order_by('-pk').values_list('pk', 'username'):
+                index[username.lower()] = pk
+            cache.set(self.username_index_key, index, None)
+        return index
+
+    def get_ids_by_usernames(self, usernames):
+        """
+        Return the ids of the active users whose username is in given list (case-insensitive),
+        in the order of the list and without duplicates. No query is done if the index is cached.
+        """
+        index = self.get_username_index()
+        ids = []
+        for username in usernames:
+            pk = index.get(username.lower())
+            if pk is not None and pk not in ids:
+                ids.append(pk)
+        return ids
+
+    def in_usernames(self, usernames):
+        """
+        Return the active users whose username is in given list (case-insensitive),
+        in the order of the list and without duplicates, using at most one query.
+        """
+        ids = self.get_ids_by_usernames(usernames)
+        users = self.in_bulk(ids) if ids else {}
+        return [users[pk] for pk in ids if pk in users]
+
 
 class ActiveUser(User):
     objects = ActiveUserManager()
@@ -1,10 +1,12 @@
-from django.db.models.signals import post_save
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
 
 from helpers.decorators import signal_ignore_fixture
 
-from .models import Profile
+from .models import Profile, ActiveUser
+from .visits import update_visitor
 
 
 @receiver(post_save, sender=User)
@@ -18,3 +20,33 @@ def create_profile_for_user(sender, **kwargs):
         profile, is_new = Profile.objects.get_or_create(user=kwargs['instance'])
         if is_new:
             profile.save()
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=User)
+def clear_username_index(sender, **kwargs):
+    """
+    Clear the index used by ActiveUser.objects.get_username_index when a user is created, renamed,
+    (de)activated or deleted. Partial updates of other fields (eg. last_login) are ignored.
+    """
+    update_fields = kwargs.get('update_fields', None)
+    if update_fields is None or {'username', 'is_active'}.intersection(update_fields):
+        cache.delete(ActiveUser.objects.username_index_key)
+
+
+@receiver(post_save, sender=Profile)
+@signal_ignore_fixture
+def update_visitor_on_profile_change(sender, instance, **kwargs):
+    """
+    Keep the avatar of online users up to date.
+    """
+    update_visitor(profile=instance)
+
+
+@receiver(post_save, sender=User)
+@signal_ignore_fixture
+def update_visitor_on_user_change(sender, instance, **kwargs):
+    """
+    Keep the username of online users up to date, and hide deactivated users.
+    """
+    update_visitor(instance)
@@ -1,6 +1,12 @@
+import datetime
+from unittest import mock
+
+from django.core.cache import cache, caches
 from django.core.urlresolvers import reverse
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
+from commons.templatetags.online import who_is_online
+from profile import visits
 from profile.models import ActivationKey, Profile, User
 
 
@@ -232,3 +238,116 @@ class AutocompleteTests(TestCase):
         response = self.client.get(reverse('profile_api_list'), {'query': 'user1', 'prefix': '@'}, format='json')
         self.assertEqual(response.status_code, 403)
 
+
+
+class LastVisitTests(TestCase):
+    fixtures = ['devel']
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.get(username='user1')
+        Profile.objects.update(last_visit=None)
+        self.client.post(reverse('auth_login'), {'username': 'user1', 'password': 'user1'})
+
+    def get_last_visit(self, user=None):
+        return Profile.objects.get(user=user or self.user).last_visit
+
+    def test_write_behind(self):
+        # The first visit is flushed immediately
+        self.client.get(reverse('homepage'))
+        first_visit = self.get_last_visit()
+        self.assertIsNotNone(first_visit)
+
+        # Next ones are flushed after LAST_VISIT_FLUSH_INTERVAL
+        self.client.get(reverse('homepage'))
+        self.assertEqual(self.get_last_visit(), first_visit)
+        self.assertGreater(visits.get_visits()['visits'][self.user.pk]['date'], first_visit)
+
+        self.assertEqual(visits.flush_visits(), 1)
+        self.assertGreater(self.get_last_visit(), first_visit)
+        self.assertEqual(visits.flush_visits(), 0)
+
+    def test_flush_single_statement(self):
+        users = User.objects.all()[:3]
+        for i, user in enumerate(users):
+            visits.record_visit(user, datetime.datetime(2016, 1, i + 1))
+        visits.record_visit(users[0], datetime.datetime(2016, 2, 1))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(visits.flush_visits(), 3)
+        self.assertEqual(self.get_last_visit(users[0]), datetime.datetime(2016, 2, 1))
+        self.assertEqual(self.get_last_visit(users[2]), datetime.datetime(2016, 1, 3))
+
+
+    @override_settings(LAST_VISIT_WRITE_BEHIND=False)
+    def test_immediate(self):
+        self.client.get(reverse('homepage'))
+        first_visit = self.get_last_visit()
+        self.client.get(reverse('homepage'))
+        self.assertGreater(self.get_last_visit(), first_visit)
+
+
+class PresenceTests(TestCase):
+    fixtures = ['devel']
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.get(username='user1')
+        self.client.post(reverse('auth_login'), {'username': 'user1', 'password': 'user1'})
+
+    def get_usernames(self):
+        return [user['username'] for user in who_is_online()]
+
+    def test_online(self):
+        self.assertEqual(self.get_usernames(), [])
+        self.client.get(reverse('homepage'))
+        self.assertEqual(self.get_usernames(), ['user1'])
+        self.assertEqual(who_is_online()[0]['avatar'], self.user.profile.avatar)
+
+        # Expired entries are ignored
+        admin = User.objects.get(username='admin')
+        visits.record_visit(admin)
+        data = cache.get(visits.VISITS_KEY)
+        data['visits'][admin.pk]['date'] -= datetime.timedelta(minutes=10)
+        cache.set(visits.VISITS_KEY, data)
+        self.assertEqual(self.get_usernames(), ['user1'])
+
+    def test_no_query(self):
+        self.client.get(reverse('homepage'))
+        with self.assertNumQueries(0):
+            visits.record_visit(self.user)
+            self.get_usernames()
+
+    def test_updates(self):
+        self.client.get(reverse('homepage'))
+
+        profile = self.user.profile
+        profile.avatar = 'http://example.com/avatar.png'
+        profile.save()
+        self.assertEqual(who_is_online()[0]['avatar'], 'http://example.com/avatar.png')
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get_usernames(), [])
+
+        self.user.is_active = True
+        self.user.save()
+        self.assertEqual(self.get_usernames(), ['user1'])
+
+    @override_settings(LAST_VISIT_WRITE_BEHIND=False)
+    def test_immediate(self):
+        self.client.get(reverse('homepage'))
+        self.assertEqual(self.get_usernames(), ['user1'])
+        self.assertIsNotNone(Profile.objects.get(user=self.user).last_visit)
+
+    def test_single_write(self):
+        self.client.get(reverse('homepage'))
+        with mock.patch.object(caches['default'], 'set', wraps=caches['default'].set) as cache_set:
+            self.client.get(reverse('homepage'))
+        # The visit and the presence of the user are recorded together
+        self.assertListEqual([call[0][0] for call in cache_set.call_args_list], [visits.VISITS_KEY])
+
+    def test_sidebar(self):
+        self.client.get(reverse('homepage'))
+        response = self.client.get(reverse('homepage'))
+        self.assertContains(response, 'title="user1" class="avatar smallavatar"')
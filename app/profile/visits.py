@@ -0,0 +1,127 @@
+"""
+Tracking of the last visit of the users, see LAST_VISIT_WRITE_BEHIND setting.
+
+Visits are recorded in the cache, with what is needed to display the visitors
+(username and avatar), so that who is online is known without querying the database.
+Entries are updated by SetLastVisitMiddleware and by profile.signals.
+
+In write-behind mode, visits are written to Profile.last_visit by flush_visits, with
+a single statement. Visits are flushed by the first request that follows
+LAST_VISIT_FLUSH_INTERVAL, and by the flush_last_visits command.
+"""
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, When, Value, DateTimeField
+
+from .models import Profile
+
+
+VISITS_KEY = 'last-visits'
+FLUSH_LOCK_KEY = 'last-visits-flush'
+
+
+def get_threshold():
+    """
+    Return the date after which a visitor is considered as online.
+    """
+    return datetime.datetime.now() - datetime.timedelta(minutes=settings.USER_IS_ONLINE_TIMEOUT)
+
+
+def get_payload(user, profile=None):
+    """
+    Return the data that is needed to display given user.
+    """
+    if profile is None:
+        profile = Profile.objects.filter(user=user).first()
+    return {
+        'id': user.pk,
+        'username': user.get_username(),
+        'avatar': profile.avatar if profile else '',
+    }
+
+
+def get_visits():
+    """
+    Return a dict with *visits*, that maps user ids to their payload (see get_payload)
+    and the date of their last recorded visit (*date* key), and *flushed*, the date of
+    the most recent visit written in the database.
+    """
+    return cache.get(VISITS_KEY, None) or {'visits': {}, 'flushed': None}
+
+
+def record_visit(user, date=None):
+    """
+    Set the last visit of given user, either immediately or in the cache. The profile
+    of the user is only loaded if the user was not already online.
+    """
+    date = date or datetime.datetime.now()
+    data = get_visits()
+    entry = data['visits'].get(user.pk) or get_payload(user)
+    entry['date'] = date
+    data['visits'][user.pk] = entry
+
+    if not settings.LAST_VISIT_WRITE_BEHIND:
+        Profile.objects.filter(user_id=user.pk).update(last_visit=date)
+        # Nothing has to be flushed, forget the visitors that are not online anymore
+        threshold = get_threshold()
+        data['visits'] = {pk: entry for pk, entry in data['visits'].items() if entry['date'] > threshold}
+    cache.set(VISITS_KEY, data, None)
+
+    # Only one request flushes the visits in each interval
+    if settings.LAST_VISIT_WRITE_BEHIND and cache.add(FLUSH_LOCK_KEY, True, settings.LAST_VISIT_FLUSH_INTERVAL):
+        flush_visits()
+
+
+def flush_visits():
+    """
+    Write the visits that were recorded since the last flush into the database, using one
+    statement, and forget the visits that are older than USER_IS_ONLINE_TIMEOUT.
+    :return: the number of updated profiles
+    """
+    data = get_visits()
+    pending = {pk: entry['date'] for pk, entry in data['visits'].items()
+               if data['flushed'] is None or entry['date'] > data['flushed']}
+    if pending:
+        Profile.objects.filter(user_id__in=pending.keys()).update(
+            last_visit=Case(*[When(user_id=pk, then=Value(date)) for pk, date in pending.items()],
+                            output_field=DateTimeField())
+        )
+
+    # Read again to lose as few concurrent visits as possible
+    data = get_visits()
+    threshold = get_threshold()
+    data['visits'] = {pk: entry for pk, entry in data['visits'].items() if entry['date'] > threshold}
+    if pending:
+        data['flushed'] = max(pending.values())
+    cache.set(VISITS_KEY, data, None)
+    return len(pending)
+
+
+def update_visitor(user=None, profile=None):
+    """
+    Refresh the payload of given user (or of the owner of given profile) if the
+    user is online, or hide it if its account was deactivated. The visit itself
+    is kept, so that it is still flushed.
+    """
+    data = get_visits()
+    pk = user.pk if user else profile.user_id
+    if pk not in data['visits']:
+        return
+    user = user or profile.user
+    entry = data['visits'][pk]
+    entry.update(get_payload(user, profile))
+    entry['hidden'] = not user.is_active
+    cache.set(VISITS_KEY, data, None)
+
+
+def get_online_users():
+    """
+    Return the payloads of the users that visited the site during the last
+    USER_IS_ONLINE_TIMEOUT minutes, ordered by registration.
+    """
+    threshold = get_threshold()
+    entries = [entry for entry in get_visits()['visits'].values()
+               if entry['date'] > threshold and not entry.get('hidden', False)]
+    return sorted(entries, key=lambda entry: entry['id'])
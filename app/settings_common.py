@@ -71,6 +71,7 @@ STATICFILES_STORAGE = 'minify.MinifyStatic'
 MINIFY_JS = True
 MINIFY_CSS = True
 MINIFY_IGNORED_PATHS = ['admin/', 'images/', 'libs/', 'rest_framework/']  # List of path prefixes
+SMILEY_AUTORELOAD = False  # Reload smileys when STATIC_ROOT/images/smiley is modified
 
 # Templates
 TEMPLATES = [  # https://docs.djangoproject.com/en/1.9/ref/templates/upgrading/#the-templates-settings
@@ -130,6 +131,8 @@ REST_FRAMEWORK = {
 
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
 USER_IS_ONLINE_TIMEOUT = 5 # in minutes
+LAST_VISIT_WRITE_BEHIND = True  # Record visits in the cache, see profile.visits
+LAST_VISIT_FLUSH_INTERVAL = 60  # In seconds, delay between two writes of the visits in the database
 SESSION_SERIALIZER = 'django.contrib.sessions.serializers.JSONSerializer'
 SESSION_COOKIE_AGE = 7257600  # 3 months
 
@@ -142,6 +145,22 @@ ABSOLUTE_URL_OVERRIDES = {
 RECAPTCHA_PUBLIC_KEY = '6LdAH_ASAAAAACAHEysPBjLekWJX94nYM0hI3hHy'
 
 
+# Search
+SEARCH_BACKEND = 'commons.search_backends.InvertedIndexBackend'
+SEARCH_MAX_RESULTS = 200  # Results are displayed by batches of this size
+
+
+# Notifications
+NOTIFICATIONS_PUSH = False  # Clients wait for changes instead of polling, each one holds a worker
+NOTIFICATIONS_LONG_POLL_TIMEOUT = 25  # In seconds, maximum duration of a request for updates
+
+
+# Minichat
+MINICHAT_PUSH = False  # Clients wait for changes instead of polling, each one holds a worker
+MINICHAT_BROKER = 'minichat.broker.CacheBroker'  # Must be shared by every process
+MINICHAT_LONG_POLL_TIMEOUT = 25  # In seconds, maximum duration of a request for updates
+
+
 # Themes
 THEMES = {
     'ALL': (
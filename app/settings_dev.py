@@ -10,6 +10,7 @@ SITE_DEMONYM = 'Lexpagiens'
 
 # Static
 MINIFY_JS = MINIFY_CSS = False
+SMILEY_AUTORELOAD = True
 
 
 # Database
@@ -30,6 +31,10 @@ CACHES = {
 }
 
 
+# Minichat
+MINICHAT_BROKER = 'minichat.broker.LocalBroker'
+
+
 # Email & admin
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 DEFAULT_FROM_EMAIL = 'admin.dev@fakemail.com'
@@ -66,3 +71,4 @@ LOGGING = {
 # Tests
 SELENIUM_WEBDRIVER = os.environ.get('SELENIUM_WEBDRIVER', None)
 RUN_NPM_TESTS = os.environ.get('RUN_NPM_TESTS', False)
+RUN_BENCHMARKS = os.environ.get('RUN_BENCHMARKS', False)
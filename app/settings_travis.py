@@ -15,6 +15,10 @@ DATABASES = {
 }
 
 
+# Search
+SEARCH_BACKEND = 'commons.search_backends.PostgreSQLBackend'
+
+
 # Cache
 CACHES = {
     'default': {
@@ -16,16 +16,15 @@ from .models import Slogan
 def new_slogan_notification(sender, created, **kwargs):
     slogan = kwargs['instance']
     if created and not slogan.is_visible:
-        recipients = User.objects.filter(groups__name='SloganTeam')
-        for recipient in recipients:
-            Notification.objects.get_or_create(
-                    recipient=recipient,
-                    title='Nouveau slogan',
-                    description='Le slogan <em>%s</em> a été proposé par %s et doit être validé pour être visible.'
-                                % (force_escape(slogan.slogan), slogan.author),
-                    action=reverse('admin:slogan_slogan_changelist'),
-                    app='slogan',
-                    key=slogan.pk)
+        recipients = User.objects.filter(groups__name='SloganTeam').values_list('pk', flat=True)
+        Notification.objects.bulk_get_or_create(
+                recipients,
+                title='Nouveau slogan',
+                description='Le slogan <em>%s</em> a été proposé par %s et doit être validé pour être visible.'
+                            % (force_escape(slogan.slogan), slogan.author),
+                action=reverse('admin:slogan_slogan_changelist'),
+                app='slogan',
+                key=slogan.pk)
 
 
 @receiver(post_save, sender=Slogan)
@@ -1,9 +1,11 @@
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.core.urlresolvers import reverse
 from django.contrib.auth.models import User
+from django.db import connection
 
 from blog.models import BlogPost
-from board.models import Thread, Message
+from board.models import Thread, Message, Flag
 
 
 class ViewsTests(TestCase):
@@ -46,3 +48,29 @@ class ViewsTests(TestCase):
         response = self.client.get(reverse('homepage'))
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.context['thread_list']), 1)
+
+    def test_recent_threads_queries(self):
+        """
+        The number of queries should not depend on the number of recent threads.
+        """
+        user = User.objects.get(username='user1')
+        self.client.login(username='user1', password='user1')
+
+        def create_threads(number):
+            for i in range(number):
+                thread = Thread(title='Test thread %d' % i)
+                thread.save()
+                message = Message(author=user, thread=thread, text='foo')
+                message.save()
+                Flag.objects.read(user, message)
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(reverse('homepage'))
+            self.assertEqual(response.status_code, 200)
+            return len(context)
+
+        create_threads(2)
+        expected = count_queries()
+        create_threads(5)
+        self.assertEqual(count_queries(), expected)
@@ -3,7 +3,7 @@
 from django.shortcuts import render
 
 from blog.models import BlogPost
-from board.models import Thread
+from board.models import Thread, Flag
 
 import datetime
 
@@ -25,11 +25,9 @@ def homepage(request):
     # Last threads to display
     date_limit = datetime.date.today() - datetime.timedelta(HOMEPAGE_THREAD_DELAY)
     date_limit = datetime.datetime(date_limit.year, date_limit.month, date_limit.day)
-    threads = Thread.objects.all().filter(last_message__date__gte=date_limit).order_by('-date_created')
+    threads = Thread.objects.active_since(date_limit).with_authors().with_last_message()
 
     # Annotate with flags
-    for thread in threads:
-        thread.annotate_flag(request.user)
-    context['thread_list'] = threads
+    context['thread_list'] = Flag.objects.annotate_threads(threads, request.user)
 
     return render(request, 'homepage.html', context)